@@ -0,0 +1,91 @@
+# -*- coding:utf-8 -*-
+"""
+show sqlite query plans and timings of hot metadata lookups before and after `upgrade_tables`
+
+    python benchmarks/benchmark_indexes.py [versions]
+"""
+import os
+import sys
+import time
+import tempfile
+import sqlalchemy as sa
+from sqlalchemy.sql import select, and_, true
+from fsqlfly.db_models import (Base, Connection, ResourceName, ResourceTemplate, ResourceVersion, Transform, Functions,
+                               create_all_tables, upgrade_tables)
+
+VERSIONS_PER_TEMPLATE = 10
+CHUNK = 10000
+
+
+def insert(engine, model, rows: list):
+    for i in range(0, len(rows), CHUNK):
+        engine.execute(model.__table__.insert(), rows[i:i + CHUNK])
+
+
+def populate(engine, versions: int):
+    templates = max(versions // VERSIONS_PER_TEMPLATE, 1)
+    insert(engine, Connection, [dict(id=1, name='c', type='jdbc', url='', connector='')])
+    insert(engine, ResourceName, [dict(id=i, name='t{}'.format(i), database='db', full_name='c.db.t{}'.format(i),
+                                       connection_id=1) for i in range(1, templates + 1)])
+    insert(engine, ResourceTemplate, [dict(id=i, name='sink', type='sink', full_name='c.db.t{}.sink'.format(i),
+                                           is_default=True, connection_id=1, resource_name_id=i)
+                                      for i in range(1, templates + 1)])
+    insert(engine, ResourceVersion, [dict(id=i, name='v{}'.format(i % 3), version=i, is_default=i % 10 == 0,
+                                          full_name='c.db.t{}.sink.{}'.format(1 + (i - 1) // VERSIONS_PER_TEMPLATE, i),
+                                          connection_id=1, template_id=1 + (i - 1) // VERSIONS_PER_TEMPLATE,
+                                          resource_name_id=1 + (i - 1) // VERSIONS_PER_TEMPLATE)
+                                     for i in range(1, versions + 1)])
+    insert(engine, Transform, [dict(name='job{}'.format(i), is_daemon=i % 2 == 0) for i in range(1, templates + 1)])
+
+
+def get_queries(versions: int) -> dict:
+    template_id = max(versions // VERSIONS_PER_TEMPLATE, 1) // 2
+    v, t, f = ResourceVersion.__table__, Transform.__table__, Functions.__table__
+    return {
+        'upsert_resource_version': select([v]).where(and_(v.c.name == 'v1', v.c.template_id == template_id)).order_by(
+            v.c.version.desc()).limit(1),
+        'default_version_of_template': select([v.c.id]).where(and_(v.c.template_id == template_id,
+                                                                   v.c.is_default == true())),
+        'versions_of_connection': select([sa.func.count(v.c.id)]).where(v.c.connection_id == 1),
+        'daemon_transforms': select([t.c.id]).where(and_(t.c.is_daemon == true(), t.c.namespace_id.is_(None))),
+        'active_functions': select([f.c.id]).where(f.c.is_active == true()),
+    }
+
+
+def explain(engine, versions: int, times: int = 20) -> dict:
+    res = dict()
+    for name, query in get_queries(versions).items():
+        sql = str(query.compile(engine, compile_kwargs={'literal_binds': True}))
+        plan = '; '.join(x[-1] for x in engine.execute('EXPLAIN QUERY PLAN ' + sql))
+        start = time.perf_counter()
+        for _ in range(times):
+            engine.execute(sql).fetchall()
+        res[name] = (plan, (time.perf_counter() - start) / times * 1000)
+    return res
+
+
+def run(versions: int):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    engine = sa.create_engine('sqlite:///' + path)
+    try:
+        create_all_tables(engine)
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.drop(engine)
+        populate(engine, versions)
+        engine.execute('ANALYZE')
+        before = explain(engine, versions)
+        print('created: {}'.format(', '.join(upgrade_tables(engine))))
+        engine.execute('ANALYZE')
+        after = explain(engine, versions)
+        for name in before:
+            print('\n{}\n  before {:8.3f} ms  {}\n  after  {:8.3f} ms  {}'.format(
+                name, before[name][1], before[name][0], after[name][1], after[name][0]))
+    finally:
+        engine.dispose()
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -4,15 +4,25 @@ import logging
 from copy import deepcopy
 from collections import defaultdict
 from datetime import datetime, date
+from airflow.exceptions import AirflowRescheduleException
 from airflow.operators.sensors import BaseSensorOperator
 from airflow.hooks.http_hook import HttpHook
+from airflow.models import Variable
+from airflow.utils.db import create_session
 from airflow.utils.decorators import apply_defaults
 
 
+def _parse_date_time(d):
+    if isinstance(d, datetime) or isinstance(d, date):
+        return str(d)
+
+
 class _BaseJobOperator(BaseSensorOperator):
     template_fields = ['data', 'headers']
     RUN_STATUS = 'RUNNING'
     FINISHED_STATUS = 'FINISHED'
+    STATE_FIELDS = ['all_jobs', 'job_pools', 'finished_jobs', 'job_last_run_id', 'failed_jobs', 'start_run_time',
+                    'job_started_at', 'job_durations']
 
     @classmethod
     def gen_job_url(cls, job_name, method):
@@ -37,13 +47,16 @@ class _BaseJobOperator(BaseSensorOperator):
     def get_status_endpoint(self, job_name):
         return self.gen_job_url(job_name, 'status')
 
+    def get_bulk_status_endpoint(self):
+        return '/api/transform/status'
+
     def complete_job(self, job_name):
         self.finished_jobs.append(job_name)
 
     @apply_defaults
     def __init__(self, http_conn_id, token, job_name,
                  data=None, headers=None, method='start', daemon=True, parallelism=0, retry_times=3, retry_sleep_time=1,
-                 *args, **kwargs):
+                 adaptive_interval=False, max_poke_interval=600, *args, **kwargs):
         basic_headers = {'Content-Type': "application/json",
                          'Token': token}
         if headers:
@@ -65,22 +78,67 @@ class _BaseJobOperator(BaseSensorOperator):
         self.retry_sleep_time = retry_sleep_time
         self.start_run_time = time.time()
         self.failed_jobs = defaultdict(int)
+        self.job_started_at = dict()
+        self.job_durations = []
+        self.adaptive_interval = adaptive_interval
+        self.max_poke_interval = max_poke_interval
+        self.has_failed_poke = False
 
         super(_BaseJobOperator, self).__init__(*args, **kwargs)
+        self.min_poke_interval = self.poke_interval
 
-    def get_req_data(self, job_name):
-        def _parse_date_time(d):
-            if isinstance(d, datetime) or isinstance(d, date):
-                return str(d)
+    def get_state_key(self, context):
+        ti = context['ti']
+        return 'fsqlfly__{}__{}__{}__{}'.format(self.dag_id, self.task_id, ti.execution_date.isoformat(), ti.try_number)
+
+    def load_state(self, context):
+        if not self.reschedule:
+            return
+        state = Variable.get(self.get_state_key(context), default_var=None, deserialize_json=True)
+        if state:
+            for k in self.STATE_FIELDS:
+                setattr(self, k, state[k])
+            self.failed_jobs = defaultdict(int, self.failed_jobs)
 
+    def save_state(self, context):
+        if self.reschedule:
+            Variable.set(self.get_state_key(context), {k: getattr(self, k) for k in self.STATE_FIELDS},
+                         serialize_json=True)
+
+    def clean_state(self, context):
+        if self.reschedule:
+            with create_session() as session:
+                session.query(Variable).filter(Variable.key == self.get_state_key(context)).delete()
+
+    def get_next_interval(self):
+        interval = self.get_adaptive_interval() if self.adaptive_interval else self.min_poke_interval
+        if self.has_failed_poke:
+            interval = max(interval, self.retry_sleep_time)
+        return interval
+
+    def get_adaptive_interval(self):
+        now = time.time()
+        started = [self.job_started_at[x] for x in self.job_pools if x in self.job_started_at]
+        if self.job_durations and started:
+            expected = sorted(self.job_durations)[len(self.job_durations) // 2]
+            interval = min(x + expected - now for x in started)
+        elif started:
+            interval = (now - min(started)) / 2
+        else:
+            interval = self.min_poke_interval
+        return max(self.min_poke_interval, min(self.max_poke_interval, interval))
+
+    def get_req_dict(self, job_name):
         send_data = deepcopy(self.data)
         last_run_job_id = self.job_last_run_id.get(job_name)
         if last_run_job_id:
             send_data['last_run_job_id'] = last_run_job_id
         if self.start_run_time:
             send_data['start_run_time'] = self.start_run_time
+        return send_data
 
-        return json.dumps(send_data, ensure_ascii=True, default=_parse_date_time)
+    def get_req_data(self, job_name):
+        return json.dumps(self.get_req_dict(job_name), ensure_ascii=True, default=_parse_date_time)
 
     def run_other_mode(self):
         for job_name in self.get_job_list():
@@ -95,11 +153,17 @@ class _BaseJobOperator(BaseSensorOperator):
         self.start_run_time = time.time()
         if self.method != 'start':
             return self.run_other_mode()
-        super(_BaseJobOperator, self).execute(context)
+        self.load_state(context)
+        try:
+            super(_BaseJobOperator, self).execute(context)
+        except AirflowRescheduleException:
+            raise
+        except Exception:
+            self.clean_state(context)
+            raise
+        self.clean_state(context)
 
-    def get_job_status(self, job_name):
-        res = self.http.run(self.get_status_endpoint(job_name), data=self.get_req_data(job_name),
-                            headers=self.headers).json()
+    def handle_status_res(self, job_name, res):
         full_msg = "req: {} code: {} msg: {}".format(job_name, res['code'], res['msg'])
         if not res['success']:
             raise Exception(full_msg)
@@ -109,8 +173,25 @@ class _BaseJobOperator(BaseSensorOperator):
             self.job_last_run_id[job_name] = job_id
         return msg
 
-    def add_job_to_pool(self, job_name):
-        status = self.get_job_status(job_name)
+    def get_job_status(self, job_name):
+        res = self.http.run(self.get_status_endpoint(job_name), data=self.get_req_data(job_name),
+                            headers=self.headers).json()
+        return self.handle_status_res(job_name, res)
+
+    def get_job_statuses(self, job_names):
+        if not job_names:
+            return dict()
+        jobs = [dict(self.get_req_dict(x), name=x) for x in job_names]
+        res = self.http.run(self.get_bulk_status_endpoint(),
+                            data=json.dumps({'jobs': jobs}, ensure_ascii=True, default=_parse_date_time),
+                            headers=self.headers).json()
+        if not res['success']:
+            raise Exception("req: {} code: {} msg: {}".format(self.get_bulk_status_endpoint(), res['code'], res['msg']))
+        return {x['name']: self.handle_status_res(x['name'], x) for x in res['data']}
+
+    def add_job_to_pool(self, job_name, status=None):
+        if status is None:
+            status = self.get_job_status(job_name)
         if status.endswith(self.RUN_STATUS):
             raise Exception("Job {} Already {}".format(job_name, status))
         self.job_pools.append(job_name)
@@ -119,22 +200,26 @@ class _BaseJobOperator(BaseSensorOperator):
                             headers=self.headers).json()
         if not res['success']:
             raise Exception('Start Job Fail response: {}'.format(str(res)))
+        self.job_started_at[job_name] = time.time()
 
     def pop_finished_job(self):
         current_size = len(self.job_pools)
+        statuses = self.get_job_statuses(self.job_pools) if self.daemon else dict()
         for _ in range(current_size):
             job_name = self.job_pools.pop(0)
             if self.daemon:
-                msg = self.get_job_status(job_name)
+                msg = statuses[job_name]
                 if msg == self.FINISHED_STATUS:
                     self.finished_jobs.append(job_name)
+                    if job_name in self.job_started_at:
+                        self.job_durations.append(time.time() - self.job_started_at.pop(job_name))
                 elif msg.endswith(self.RUN_STATUS):
                     logging.debug("Wait For :" + msg)
                     self.job_pools.append(job_name)
                 else:
                     if self.failed_jobs[job_name] < self.retry_times:
                         self.failed_jobs[job_name] += 1
-                        time.sleep(self.retry_sleep_time)
+                        self.has_failed_poke = True
                         self.job_pools.append(job_name)
                     else:
                         err_info = "Job {} Fail With Other Exception: {}".format(job_name, msg)
@@ -150,11 +235,19 @@ class _BaseJobOperator(BaseSensorOperator):
         return True
 
     def poke(self, context):
+        self.has_failed_poke = False
         run_jobs = self.get_job_list()
-        while (len(self.job_pools) < self.parallelism or self.parallelism == 0) and run_jobs:
-            job_name = run_jobs.pop()
-            self.add_job_to_pool(job_name)
-        return self.job_pool_finished()
+        new_jobs = []
+        while (len(self.job_pools) + len(new_jobs) < self.parallelism or self.parallelism == 0) and run_jobs:
+            new_jobs.append(run_jobs.pop())
+        statuses = self.get_job_statuses(new_jobs)
+        for job_name in new_jobs:
+            self.add_job_to_pool(job_name, statuses[job_name])
+        finished = self.job_pool_finished()
+        if not finished:
+            self.poke_interval = self.get_next_interval()
+            self.save_state(context)
+        return finished
 
 
 class FSQLFlyOperator(_BaseJobOperator):
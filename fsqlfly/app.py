@@ -6,6 +6,8 @@ from typing import Callable, Optional
 from logzero import logger
 from fsqlfly import settings
 from fsqlfly import handles
+from fsqlfly.utils.terminal import TERMINAL_POOL, TERMINAL_REAPER
+from fsqlfly.workflow import get_debug_environment
 
 
 class IndexHandler(tornado.web.RequestHandler):
@@ -29,6 +31,10 @@ def run_web(*args, extend_command: Optional[Callable] = None, **kwargs):
     )
     logger.info("start running on http://localhost:{} ... ".format(settings.FSQLFLY_WEB_PORT))
     application.listen(settings.FSQLFLY_WEB_PORT)
+    if TERMINAL_POOL.enable:
+        TERMINAL_POOL.watch(*get_debug_environment(dict()))
+        TERMINAL_POOL.schedule_refill()
+    TERMINAL_REAPER.start(settings.FSQLFLY_TERMINAL_REAP_INTERVAL)
     if extend_command is not None:
         extend_command()
     tornado.ioloop.IOLoop.current().start()
@@ -2,11 +2,12 @@
 import json
 import attr
 from logzero import logger
-from typing import Any, Optional, Awaitable
+from typing import Any, Optional, Awaitable, Union
 from datetime import datetime, date
 from tornado.web import RequestHandler
 from fsqlfly import settings
 from fsqlfly.common import DBRes
+from fsqlfly.db_helper import DBSession
 from fsqlfly.utils.strings import dict2camel, dict2underline
 
 
@@ -68,6 +69,10 @@ class BaseHandler(RequestHandler):
             logger.debug("parse data error {}".format(self.request.body.decode(errors='ignore')))
             return dict()
 
+    def finish(self, chunk: Optional[Union[str, bytes, dict]] = None):
+        DBSession.commit_current()
+        return super(BaseHandler, self).finish(chunk)
+
     def set_default_headers(self):
         self.set_header('Content-Type', 'application/json; charset=utf-8')
 
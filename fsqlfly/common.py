@@ -28,6 +28,7 @@ class PageModelMode(_BaseArg):
     init = 'init'
     clean = 'clean'
     list = 'list'
+    start = 'start'
 
 
 class FlinkTableType(_BaseArg):
@@ -199,7 +200,7 @@ class NameFilter:
         return False
 
 
-@attr.s
+@attr.s(slots=True, frozen=True)
 class SchemaField:
     name: str = attr.ib()
     type: str = attr.ib()
@@ -361,5 +362,8 @@ use_partition:  false
 partition_name:  pt
 partition_value:  {{ ds_nodash }}
 overwrite:  false
+bundle_size:  1
+bundle_name_format:  {{ source_type }}2{{ target_type }}__{{ connector.name }}__bundle_{{ index }}
+bundle_prune:  false
 
 """
@@ -1,21 +1,33 @@
 import os
+import inspect
+import threading
 import traceback
 import yaml
-from functools import wraps, partial
+from contextlib import contextmanager
+from functools import wraps
 from copy import deepcopy
-from typing import Callable, Type, Optional, List, Union, Any, TypeVar
+from datetime import datetime
+from typing import Callable, Type, Optional, List, Union, Any, TypeVar, Dict, Iterable, Tuple, Iterator, Set
 from collections import defaultdict
-from sqlalchemy import and_, event
+from sqlalchemy import and_, or_, event, func, inspect as sa_inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, Query
+from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.orm.session import Session, sessionmaker, query as session_query
 from sqlalchemy.sql.expression import true
 from sqlalchemy.engine import Engine
+from tornado.web import HTTPError
 from fsqlfly import settings
 from fsqlfly.common import DBRes
 from fsqlfly.settings import ENGINE
 from fsqlfly.settings import FSQLFLY_UPLOAD_DIR
-from fsqlfly.db_models import (create_all_tables, delete_all_tables, Base, Connection, SchemaEvent, Connector,
-                               ResourceName, ResourceVersion, ResourceTemplate, Namespace, FileResource, Transform,
-                               Functions, TransformSavepoint)
+from fsqlfly.utils.files import JAR_STORE
+from fsqlfly.metadata import MetadataCache, MetadataSnapshot, SNAPSHOT_MODELS, listen_metadata_change
+from fsqlfly.db_models import (create_all_tables, delete_all_tables, upgrade_tables, Base, Connection, SchemaEvent,
+                               Connector, ResourceName, ResourceVersion, ResourceTemplate, Namespace, FileResource,
+                               Transform, Functions, TransformSavepoint, TransformDaemonState, DaemonMember,
+                               SaveDict)
 
 Query = session_query.Query
 
@@ -41,6 +53,7 @@ DBT = TypeVar('DBT', Connection, Connector, SchemaEvent, ResourceName, ResourceT
 class DBSession:
     engine = None
     _Session = None
+    _local = threading.local()
 
     @classmethod
     def init_engine(cls, engine: Engine):
@@ -52,27 +65,87 @@ class DBSession:
         assert cls.engine is not None
         return cls._Session(*args, **kwargs)
 
+    @classmethod
+    def current(cls) -> Optional[Session]:
+        return getattr(cls._local, 'session', None)
+
+    @classmethod
+    def commit_current(cls):
+        session = cls.current()
+        if session is not None:
+            session.commit()
+
+    @classmethod
+    @contextmanager
+    def scope(cls) -> Iterator[Session]:
+        outer = cls.current()
+        if outer is not None:
+            yield outer
+            return
+        session = cls.get_session()
+        cls._local.session = session
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            cls._local.session = None
+            session.close()
+
 
 DBSession.init_engine(ENGINE)
 
+METADATA_CACHE = MetadataCache(settings.FSQLFLY_METADATA_CHECK_INTERVAL)
+listen_metadata_change(METADATA_CACHE)
+
+
+def session_scope(func: Callable) -> Callable:
+    assert not inspect.iscoroutinefunction(func), 'session scope can not cross await: {}'.format(func)
+
+    @wraps(func)
+    def _scope(handler, *args, **kwargs):
+        try:
+            with DBSession.scope():
+                return func(handler, *args, **kwargs)
+        except HTTPError:
+            raise
+        except Exception as error:
+            if settings.FSQLFLY_DEBUG or handler._finished:
+                raise error
+            handler.clear()
+            handler.write_res(DBRes.sever_error(msg=f'meet {traceback.format_exc()}'))
+
+    return _scope
+
 
 def session_add(func: Callable) -> Callable:
     @wraps(func)
     def _add_session(*args, **kwargs):
-        session = kwargs['session'] if 'session' in kwargs else DBSession.get_session()
+        scoped = DBSession.current() if 'session' not in kwargs else None
+        if 'session' in kwargs:
+            session = kwargs['session']
+        else:
+            session = scoped if scoped is not None else DBSession.get_session()
         new_kwargs = {k: v for k, v in kwargs.items() if k != 'session'}
         try:
             res = func(*args, session=session, **new_kwargs)
-            session.commit()
+            if scoped is not None:
+                session.flush()
+            else:
+                session.commit()
             return res
         except Exception as error:
+            if scoped is not None:
+                raise error
             session.rollback()
             if settings.FSQLFLY_DEBUG:
                 raise error
             err = traceback.format_exc()
             return DBRes.sever_error(msg=f'meet {err}')
         finally:
-            if 'session' not in kwargs:
+            if 'session' not in kwargs and scoped is None:
                 session.close()
 
     return _add_session
@@ -91,10 +164,19 @@ def filter_not_support(func: Callable) -> Callable:
 
 
 class DBDao:
+    @classmethod
+    def get_metadata(cls) -> MetadataSnapshot:
+        return METADATA_CACHE.get(DBSession.engine, DBSession.get_session)
+
     @classmethod
     @session_add
     @filter_not_support
     def name2pk(cls, model: str, name: str, *args, session: Session, base: Type[DBT], **kwargs) -> int:
+        if base in SNAPSHOT_MODELS:
+            try:
+                return cls.get_metadata().name2pk(base, name)
+            except NoResultFound:
+                pass
         return session.query(base.id).filter(base.name == name).one()[0]
 
     @classmethod
@@ -124,7 +206,7 @@ class DBDao:
     def create(cls, model: str, obj: dict, *args, session: Session, base: Type[DBT], **kwargs) -> DBRes:
         db_obj = base(**obj)
         session.add(db_obj)
-        session.commit()
+        session.flush()
         return DBRes(data=db_obj.as_dict())
 
     @classmethod
@@ -159,28 +241,83 @@ class DBDao:
 
     @classmethod
     @session_add
-    def get_require_name(cls, *args, session: Session, **kwargs) -> DBRes:
-        query = session.query(ResourceVersion.full_name).join(ResourceVersion.connection).join(
-            ResourceVersion.resource_name)
-        version_data = [x[0] for x in
-                        query.filter(and_(Connection.is_active == true(), ResourceName.is_active == true())).all()]
+    def get_transforms_by_names(cls, names: Iterable[str], *args, session: Session, **kwargs) -> Dict[str, Transform]:
+        names = set(names)
+        ids = [int(x) for x in names if x.isdigit()]
+        query = session.query(Transform).filter(or_(Transform.name.in_(list(names)), Transform.id.in_(ids)))
+        res = dict()
+        for x in query.all():
+            if x.name in names:
+                res[x.name] = x
+            if str(x.id) in names:
+                res[str(x.id)] = x
+        return res
+
+    @classmethod
+    @session_add
+    def get_daemon_states(cls, transform_ids: Iterable[int], *args, session: Session,
+                          **kwargs) -> Dict[int, SaveDict]:
+        query = session.query(TransformDaemonState).filter(TransformDaemonState.transform_id.in_(list(transform_ids)))
+        return {x.transform_id: x.as_dict() for x in query.all()}
+
+    @classmethod
+    @session_add
+    def get_due_daemon_transform_ids(cls, now: datetime, *args, session: Session, **kwargs) -> List[int]:
+        query = session.query(TransformDaemonState.transform_id).filter(
+            TransformDaemonState.next_attempt_at.isnot(None), TransformDaemonState.next_attempt_at <= now)
+        return [x for x, in query.all()]
+
+    @classmethod
+    @session_add
+    def claim_daemon_state(cls, transform_id: int, now: datetime, lease_until: datetime, *args, session: Session,
+                           **kwargs) -> Optional[SaveDict]:
+        query = session.query(TransformDaemonState).filter(TransformDaemonState.transform_id == transform_id)
+        if query.first() is None:
+            try:
+                with session.begin_nested():
+                    session.add(TransformDaemonState(transform_id=transform_id, failure_count=0, success_count=0))
+            except IntegrityError:
+                pass
+        updated = query.filter(or_(TransformDaemonState.next_attempt_at.is_(None),
+                                   TransformDaemonState.next_attempt_at <= now)).update(
+            {TransformDaemonState.last_attempt_at: now, TransformDaemonState.next_attempt_at: lease_until},
+            synchronize_session=False)
+        if not updated:
+            return None
+        return query.one().as_dict()
 
-        v_query = session.query(ResourceVersion).join(ResourceVersion.connection).join(
-            ResourceVersion.resource_name)
-        default_version_data = list(x.template.full_name for x in v_query.filter(
-            and_(Connection.is_active == true(), ResourceName.is_active == true(),
-                 ResourceVersion.is_default == true())).all())
-        t_query = session.query(ResourceTemplate).join(ResourceTemplate.connection).join(
-            ResourceTemplate.resource_name)
-        resource_data = list(x.resource_name.full_name for x in t_query.filter(
-            and_(Connection.is_active == true(),
-                 ResourceName.is_active == true(),
-                 ResourceTemplate.is_default == true())).all())
+    @classmethod
+    @session_add
+    def heartbeat_daemon_member(cls, member_id: str, now: datetime, expire_before: datetime, *args,
+                                session: Session, **kwargs) -> List[str]:
+        updated = session.query(DaemonMember).filter(DaemonMember.member_id == member_id).update(
+            {DaemonMember.heartbeat_at: now}, synchronize_session=False)
+        if not updated:
+            try:
+                with session.begin_nested():
+                    session.add(DaemonMember(member_id=member_id, heartbeat_at=now))
+            except IntegrityError:
+                pass
+        session.query(DaemonMember).filter(DaemonMember.heartbeat_at < expire_before).delete(
+            synchronize_session=False)
+        return [x[0] for x in session.query(DaemonMember.member_id).order_by(DaemonMember.member_id).all()]
 
-        hive_data = [x[0] for x in session.query(Connection.name).filter(Connection.is_active == true(),
-                                                                         Connection.type == 'hive').all()]
+    @classmethod
+    @session_add
+    def remove_daemon_member(cls, member_id: str, *args, session: Session, **kwargs) -> int:
+        return session.query(DaemonMember).filter(DaemonMember.member_id == member_id).delete(
+            synchronize_session=False)
+
+    @classmethod
+    @session_add
+    def update_daemon_state(cls, transform_id: int, values: dict, *args, session: Session, **kwargs) -> int:
+        query = session.query(TransformDaemonState).filter(TransformDaemonState.transform_id == transform_id)
+        return query.update(values, synchronize_session=False)
 
-        return DBRes(data=hive_data + version_data + default_version_data + resource_data)
+    @classmethod
+    @session_add
+    def get_require_name(cls, *args, session: Session, **kwargs) -> DBRes:
+        return DBRes(data=cls.get_metadata().get_require_name())
 
     @classmethod
     def is_hive_table(cls, full_name: str) -> bool:
@@ -201,10 +338,10 @@ class DBDao:
     def get_require_table(cls, require: str, *args, session: Session, **kwargs) -> List[dict]:
         names = set()
         res = []
-        for full_name in require.split(','):
-            if cls.is_hive_table(full_name):
-                continue
-            version = cls.get_require_version_by_name(full_name, session)
+        full_names = [x for x in require.split(',') if not cls.is_hive_table(x)]
+        versions = cls.get_require_versions_by_names(full_names, session)
+        for full_name in full_names:
+            version = versions.get(full_name)
 
             assert version, "Not Found {} in database, try use full name".format(full_name)
             cache = version.generate_version_cache()
@@ -220,17 +357,51 @@ class DBDao:
 
     @classmethod
     def get_require_version_by_name(cls, full_name: str, session: Session) -> Optional[ResourceVersion]:
-        version = session.query(ResourceVersion).filter(ResourceVersion.full_name == full_name).first()
-        if version is None:
-            version = session.query(ResourceVersion).join(ResourceVersion.template).filter(
-                and_(ResourceTemplate.full_name == full_name,
-                     ResourceVersion.is_default == true())).first()
-            if version is None:
-                version = session.query(ResourceVersion).join(ResourceVersion.template).join(
-                    ResourceVersion.resource_name).filter(and_(ResourceName.full_name == full_name,
-                                                               ResourceTemplate.is_default == true(),
-                                                               ResourceVersion.is_default == true())).first()
-        return version
+        return cls.get_require_versions_by_names([full_name], session).get(full_name)
+
+    @classmethod
+    def get_require_versions_by_names(cls, full_names: Iterable[str],
+                                      session: Session) -> Dict[str, ResourceVersion]:
+        left = set(full_names)
+        if not left:
+            return dict()
+        ids = cls.get_metadata().find_version_ids(left)
+        query = session.query(ResourceVersion).options(joinedload(ResourceVersion.template),
+                                                       joinedload(ResourceVersion.resource_name),
+                                                       joinedload(ResourceVersion.connection),
+                                                       joinedload(ResourceVersion.schema_version))
+        res = dict()
+        if ids:
+            versions = {x.id: x for x in query.filter(ResourceVersion.id.in_(set(ids.values()))).all()}
+            res = {k: versions[v] for k, v in ids.items() if v in versions}
+        left -= set(res)
+        if left:
+            res.update(cls.find_versions_by_names(query, left))
+        return res
+
+    @classmethod
+    def find_versions_by_names(cls, query: Query, left: Set[str]) -> Dict[str, ResourceVersion]:
+        res = dict()
+        for version in query.filter(ResourceVersion.full_name.in_(left)).all():
+            res[version.full_name] = version
+        left = left - set(res)
+
+        if left:
+            t_query = query.join(ResourceVersion.template).filter(and_(ResourceTemplate.full_name.in_(left),
+                                                                       ResourceVersion.is_default == true()))
+            for version in t_query.all():
+                res.setdefault(version.template.full_name, version)
+            left -= set(res)
+
+        if left:
+            r_query = query.join(ResourceVersion.template).join(ResourceVersion.resource_name).filter(
+                and_(ResourceName.full_name.in_(left),
+                     ResourceTemplate.is_default == true(),
+                     ResourceVersion.is_default == true()))
+            for version in r_query.all():
+                res.setdefault(version.resource_name.full_name, version)
+
+        return res
 
     @classmethod
     def get_version_shortest_name(cls, names: set, version: ResourceVersion) -> Optional[str]:
@@ -260,32 +431,27 @@ class DBDao:
         return res
 
     @classmethod
-    @session_add
-    def get_require_functions(cls, *args, session: Session, **kwargs) -> List[dict]:
+    def get_require_functions(cls) -> List[dict]:
         res = []
-        for f in session.query(Functions).filter(Functions.is_active == true()).all():
+        for f, _ in cls.get_metadata().get_functions():
             fc = {
-                'name': f.name,
+                'name': f['name'],
                 'from': 'class',
-                'class': f.class_name
+                'class': f['class_name']
             }
-            if f.constructor_config.strip():
-                fc['constructor'] = yaml.load(f.constructor_config, yaml.FullLoader)
+            if f['constructor_config'] and f['constructor_config'].strip():
+                fc['constructor'] = yaml.load(f['constructor_config'], yaml.FullLoader)
             res.append(fc)
         return res
 
     @classmethod
-    @session_add
-    def get_require_jar(cls, *args, session: Session, **kwargs) -> List[str]:
-        res = []
-        for f in session.query(Functions).filter(Functions.is_active == true()).all():
-            r_p = os.path.join(FSQLFLY_UPLOAD_DIR, f.resource.real_path[1:])
-            res.append(r_p)
+    def get_function_jars(cls) -> List[Tuple[str, str]]:
+        return [(f['name'], os.path.join(FSQLFLY_UPLOAD_DIR, r['real_path'][1:]))
+                for f, r in cls.get_metadata().get_functions()]
 
-        out = []
-        for x in set(res):
-            out.extend(['-j', x])
-        return out
+    @classmethod
+    def get_require_jar(cls) -> List[str]:
+        return JAR_STORE.get_args([path for _, path in cls.get_function_jars()])
 
     @classmethod
     def one(cls, *args, session: Session,
@@ -308,9 +474,9 @@ class DBDao:
     def _clean(cls, obj: DBT, session: Session, base: Type[DBT]):
         back = obj.as_dict()
         session.delete(obj)
-        session.commit()
+        session.flush()
         session.add(base(**back))
-        session.commit()
+        session.flush()
 
     @classmethod
     @session_add
@@ -321,7 +487,7 @@ class DBDao:
             back = obj.as_dict()
             source, target = obj.source, obj.target
             session.delete(obj)
-            session.commit()
+            session.flush()
             cls._clean(source, session, Connection)
             cls._clean(target, session, Connection)
             session.add(Connector(**back))
@@ -372,19 +538,45 @@ class DBDao:
     def create_all_tables(cls):
         create_all_tables(DBSession.engine)
 
+    @classmethod
+    def upgrade_tables(cls) -> List[str]:
+        return upgrade_tables(DBSession.engine)
+
     @classmethod
     def delete_all_tables(cls, force: bool = False):
         delete_all_tables(DBSession.engine, force)
 
 
-def update_default_value(mapper, connection, target, father_name):
-    if target.is_default:
-        father_id = getattr(target, father_name)
-        father_id = int(father_id) if isinstance(father_id, str) else father_id
-        sql = 'update %s set is_default = 0 where id <> %d and is_default = 1 and %s = %d'
-        connection.execute(sql % (mapper.local_table.fullname, target.id, father_name, father_id))
+DEFAULT_FATHERS = {ResourceTemplate: 'resource_name_id', ResourceVersion: 'template_id'}
+
+
+def is_new_default(obj: Base, father_name: str) -> bool:
+    if not obj.is_default:
+        return False
+    state = sa_inspect(obj)
+    if state.pending or not state.has_identity:
+        return True
+    return state.attrs.is_default.history.has_changes() or state.attrs[father_name].history.has_changes()
+
+
+def reset_default_value(session: Session, flush_context):
+    for model, father_name in DEFAULT_FATHERS.items():
+        keep = dict()
+        for obj in list(session.new) + list(session.dirty):
+            if isinstance(obj, model) and is_new_default(obj, father_name):
+                father_id = int(getattr(obj, father_name))
+                keep[father_id] = max(keep.get(father_id, obj.id), obj.id)
+        if not keep:
+            continue
+        table = model.__table__
+        session.execute(table.update().where(and_(table.c[father_name].in_(list(keep)),
+                                                  table.c.is_default == true(),
+                                                  table.c.id.notin_(list(keep.values())))).values(
+            is_default=False, updated_at=func.now()))
+        for obj in session.identity_map.values():
+            loaded = sa_inspect(obj).dict
+            if isinstance(obj, model) and loaded.get(father_name) in keep and loaded.get('id') not in keep.values():
+                set_committed_value(obj, 'is_default', False)
 
 
-for _mode in ['after_insert', 'after_update']:
-    for _model, f_n in zip([ResourceTemplate, ResourceVersion], ['resource_name_id', 'template_id']):
-        event.listen(_model, _mode, partial(update_default_value, father_name=f_n))
+event.listen(Session, 'after_flush', reset_default_value)
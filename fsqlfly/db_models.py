@@ -1,17 +1,18 @@
 import json
+import attr
 import sqlalchemy as sa
-from jinja2 import Template
 from datetime import datetime
+from functools import lru_cache
 from configparser import ConfigParser
-from typing import Tuple, TypeVar, Any, Optional, Type, Union
-from sqlalchemy import Column, String, ForeignKey, Integer, DateTime, Boolean, Text, UniqueConstraint
+from typing import Tuple, TypeVar, Any, Optional, Type, Union, Dict, List
+from sqlalchemy import Column, String, ForeignKey, Integer, Date, DateTime, Boolean, Text, UniqueConstraint, Index
 from sqlalchemy.orm import relationship, backref
 from sqlalchemy.ext.declarative import declarative_base
 from fsqlfly.common import (FlinkConnectorType, FlinkTableType, ConnectorType, DEFAULT_CONFIG, CanalMode, SchemaField,
                             BlinkSQLType, NameFilter, SchemaContent, VersionConfig, FlinkSaveFormat)
 
-from fsqlfly.utils.strings import load_yaml
-from fsqlfly.utils.template import generate_template_context
+from fsqlfly.utils.strings import load_yaml, load_yaml_cached
+from fsqlfly.utils.template import generate_template_context, render_template
 from fsqlfly.utils.db_execute import execute
 from sqlalchemy_utils import ChoiceType, Choice
 from logzero import logger
@@ -28,6 +29,57 @@ def _b(x: str):
     return backref(x, cascade="delete, delete-orphan")
 
 
+class ParsedConfig:
+    __slots__ = ('parser', 'sections')
+
+    def __init__(self, parser: ConfigParser):
+        self.parser = parser
+        self.sections = {x: dict(parser.items(x)) for x in parser.sections()}
+
+    def copy_parser(self) -> ConfigParser:
+        parser = ConfigParser()
+        parser.read_dict({x: dict(self.parser.items(x, raw=True)) for x in self.parser.sections()})
+        return parser
+
+    def extend(self, config: Optional[str]) -> 'ParsedConfig':
+        if config and config.strip():
+            parser = self.copy_parser()
+            parser.read_string(config)
+            return ParsedConfig(parser)
+        return self
+
+
+def _parse_default_config() -> ParsedConfig:
+    parser = ConfigParser()
+    parser.read_string(DEFAULT_CONFIG)
+    return ParsedConfig(parser)
+
+
+DEFAULT_PARSED_CONFIG = _parse_default_config()
+
+
+@lru_cache(maxsize=2048)
+def load_parsed_config(model: str, pk: Optional[int], *configs: Optional[str]) -> ParsedConfig:
+    res = DEFAULT_PARSED_CONFIG
+    for config in configs:
+        res = res.extend(config)
+    return res
+
+
+@lru_cache(maxsize=4096)
+def load_schema_fields(fields: str) -> Tuple[SchemaField, ...]:
+    try:
+        data = json.loads(fields)
+    except ValueError:
+        data = load_yaml_cached(fields)
+    return tuple(SchemaField(**x) for x in data) if data else tuple()
+
+
+def dump_schema_fields(fields: List[SchemaField]) -> str:
+    data = [{k: v for k, v in attr.asdict(x).items() if v is not None} for x in fields]
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
 class SaveDict(dict):
     @property
     def id(self):
@@ -39,7 +91,7 @@ class Base(_Base):
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     created_at = Column(DateTime, server_default=sa.func.now())
-    updated_at = Column(DateTime, server_default=sa.func.now(), server_onupdate=sa.func.now())
+    updated_at = Column(DateTime, server_default=sa.func.now(), onupdate=sa.func.now(), server_onupdate=sa.func.now())
     is_locked = Column(Boolean, default=False)
 
     def as_dict(self) -> SaveDict:
@@ -52,28 +104,32 @@ class Base(_Base):
 
     @classmethod
     def get_default_config_parser(cls) -> ConfigParser:
-        default_config_parser = ConfigParser()
+        return DEFAULT_PARSED_CONFIG.copy_parser()
 
-        default_config_parser.read_string(DEFAULT_CONFIG)
-        return default_config_parser
+    def get_config_texts(self) -> Tuple[Optional[str], ...]:
+        return tuple()
+
+    def get_parsed_config(self) -> ParsedConfig:
+        return load_parsed_config(self.__class__.__name__, self.id, *self.get_config_texts())
 
     def get_config_parser(self) -> ConfigParser:
-        return self.get_default_config_parser()
+        return self.get_parsed_config().copy_parser()
+
+    def get_config_section(self, section: str) -> Dict[str, str]:
+        return self.get_parsed_config().sections[section]
 
     def get_config(self, name: str, section: str, typ: Optional[Type[CONFIG_T]] = None) -> CONFIG_T:
-        cache_name = '__config_parser__'
-        if not hasattr(self, cache_name):
-            setattr(self, cache_name, self.get_config_parser())
-        parser = getattr(self, cache_name)
-        secret = parser[section]
-        if typ:
+        value = self.get_config_section(section).get(name)
+        if typ and value is not None:
             if typ is int:
-                return secret.getint(name)
+                return int(value)
             elif typ is float:
-                return secret.getint(name)
+                return float(value)
             elif typ is bool:
-                return secret.getboolean(name)
-        return secret.get(name)
+                if value.lower() not in ConfigParser.BOOLEAN_STATES:
+                    raise ValueError('Not a boolean: %s' % value)
+                return ConfigParser.BOOLEAN_STATES[value.lower()]
+        return value
 
 
 class Connection(Base):
@@ -93,17 +149,13 @@ class Connection(Base):
                    typ: Optional[Union[Type[int], Type[float], Type[float], Type[str]]] = None) -> Any:
         return super(Connection, self).get_config(name, section=section if section else self.type, typ=typ)
 
-    def get_config_parser(self) -> ConfigParser:
-        parser = super(Connection, self).get_config_parser()
-        if self.config and self.config.strip():
-            parser.read_string(self.config)
-
-        return parser
+    def get_config_texts(self) -> Tuple[Optional[str], ...]:
+        return self.config,
 
     def get_connection_connector(self) -> dict:
-        config = self.get_config_parser()
-        context = generate_template_context(execution_date=datetime.now(), connection=self, **config[self.type])
-        output = Template(self.connector).render(**context)
+        config = self.get_config_section(self.type)
+        context = generate_template_context(execution_date=datetime.now(), connection=self, **config)
+        output = render_template(self.connector, **context)
         return load_yaml(output)
 
 
@@ -125,11 +177,19 @@ class SchemaEvent(Base):
     fields = Column(Text)
     partitionable = Column(Boolean, default=False)
 
+    @property
+    def schema_fields(self) -> Tuple[SchemaField, ...]:
+        cache = getattr(self, '_schema_fields_cache', None)
+        if cache is None or cache[0] is not self.fields:
+            cache = (self.fields, load_schema_fields(self.fields) if self.fields else tuple())
+            self._schema_fields_cache = cache
+        return cache[1]
+
     def to_schema_content(self) -> SchemaContent:
         origin_dict = self.as_dict()
         use = ['name', 'database', 'comment', 'partitionable']
         origin = {k: v for k, v in origin_dict.items() if k in use}
-        origin['fields'] = [SchemaField(**x) for x in load_yaml(self.fields)] if self.fields else []
+        origin['fields'] = list(self.schema_fields)
         origin['type'] = self.connection.type.code
         return SchemaContent(**origin)
 
@@ -147,12 +207,8 @@ class Connector(Base):
     generate_sql = Column(Text)
     cache = Column(Text)
 
-    def get_config_parser(self) -> ConfigParser:
-        parser = self.get_default_config_parser()
-        if self.config and self.config.strip():
-            parser.read_string(self.config)
-
-        return parser
+    def get_config_texts(self) -> Tuple[Optional[str], ...]:
+        return self.config,
 
     @property
     def connector_mode(self) -> CanalMode:
@@ -228,13 +284,20 @@ class Connector(Base):
     def get_transform_name_format(self, resource_name: 'ResourceName', **kwargs) -> str:
         self.check_system_type()
         source_type, target_type = self.source.type.code, self.target.type.code
-        return Template(self.get_config('transform_name_format')).render(
-            generate_template_context(source_type=source_type, target_type=target_type,
-                                      resource_name=resource_name, connector=self, **kwargs))
+        return render_template(self.get_config('transform_name_format'),
+                               **generate_template_context(source_type=source_type, target_type=target_type,
+                                                           resource_name=resource_name, connector=self, **kwargs))
+
+    def get_bundle_name_format(self, index: int, **kwargs) -> str:
+        self.check_system_type()
+        source_type, target_type = self.source.type.code, self.target.type.code
+        return render_template(self.get_config('bundle_name_format'),
+                               **generate_template_context(source_type=source_type, target_type=target_type,
+                                                           index=index, connector=self, **kwargs))
 
     def get_transform_target_full_name(self, **kwargs) -> Tuple[str, str]:
-        database = Template(self.get_config('target_database_format')).render(**kwargs)
-        table = Template(self.get_config('target_table_format')).render(**kwargs)
+        database = render_template(self.get_config('target_database_format'), **kwargs)
+        table = render_template(self.get_config('target_table_format'), **kwargs)
         return database, table
 
     @property
@@ -257,6 +320,16 @@ class Connector(Base):
         self.check_system_type()
         return json.loads(self.get_config('execution_restart_strategy', typ=str))
 
+    @property
+    def system_bundle_size(self) -> int:
+        self.check_system_type()
+        return max(self.get_config('bundle_size', typ=int) or 1, 1)
+
+    @property
+    def system_bundle_prune(self) -> bool:
+        self.check_system_type()
+        return self.get_config('bundle_prune', typ=bool)
+
     @property
     def partition_key_value(self) -> Tuple[str, str]:
         self.check_system_type()
@@ -284,12 +357,8 @@ class ResourceName(Base):
     def get_include(self):
         return self.database + '.' + self.name if self.database else self.name
 
-    def get_config_parser(self) -> ConfigParser:
-        parser = self.connection.get_config_parser()
-        if self.config and self.config.strip():
-            parser.read_string(self.config)
-
-        return parser
+    def get_config_texts(self) -> Tuple[Optional[str], ...]:
+        return self.connection.get_config_texts() + (self.config,)
 
     def get_config(self, name: str, section: Optional[str] = None,
                    typ: Optional[Union[Type[CONFIG_T]]] = None) -> CONFIG_T:
@@ -308,6 +377,8 @@ class ResourceTemplate(Base):
     __tablename__ = 'resource_template'
     __table_args__ = (
         UniqueConstraint('resource_name_id', 'name'),
+        Index('ix_resource_template_resource_name_default', 'resource_name_id', 'is_default'),
+        Index('ix_resource_template_connection', 'connection_id'),
     )
     name = Column(String(128), nullable=False)
     type = Column(TABLE_TYPE, nullable=False)
@@ -328,6 +399,10 @@ class ResourceVersion(Base):
     __tablename__ = 'resource_version'
     __table_args__ = (
         UniqueConstraint('template_id', 'version'),
+        Index('ix_resource_version_template_name_version', 'template_id', 'name', 'version'),
+        Index('ix_resource_version_template_default', 'template_id', 'is_default'),
+        Index('ix_resource_version_connection', 'connection_id'),
+        Index('ix_resource_version_resource_name', 'resource_name_id'),
     )
     name = Column(String(128), nullable=False, default='latest')
     info = Column(Text)
@@ -348,12 +423,12 @@ class ResourceVersion(Base):
     cache = Column(Text)
 
     def get_connection_connector(self) -> dict:
-        config = self.resource_name.get_config_parser()
+        config = self.resource_name.get_config_section(self.connection.type)
         context = generate_template_context(execution_date=datetime.now(), connection=self.connection,
                                             schema=self.schema_version,
                                             tempalte=self.template, resource_name=self.resource_name,
-                                            version=self, **config[self.connection.type])
-        output = Template(self.connection.connector).render(**context)
+                                            version=self, **config)
+        output = render_template(self.connection.connector, **context)
         return load_yaml(output)
 
     @classmethod
@@ -460,7 +535,7 @@ class ResourceVersion(Base):
 
         connector = self.generate_table_connector(connection, connection_type, resource_name, schema, template, version)
         res['connector'] = connector if connector else None
-        fields = [SchemaField(**x) for x in load_yaml(schema.fields)] if schema.fields else []
+        fields = schema.schema_fields if isinstance(schema, SchemaEvent) else schema.fields
         need_fields = [x for x in fields if x.name in NameFilter(config.include, config.exclude)]
         field_names = [x.name for x in need_fields]
         schemas = []
@@ -551,6 +626,9 @@ class FileResource(Base):
 
 class Functions(Base):
     __tablename__ = 'functions'
+    __table_args__ = (
+        Index('ix_functions_is_active', 'is_active'),
+    )
     name = Column(String(256), unique=True, nullable=False)
     class_name = Column(String(512), nullable=False)
     constructor_config = Column(Text)
@@ -564,6 +642,10 @@ class Functions(Base):
 
 class Transform(Base):
     __tablename__ = 'transform'
+    __table_args__ = (
+        Index('ix_transform_daemon_namespace', 'is_daemon', 'namespace_id'),
+        Index('ix_transform_connector', 'connector_id'),
+    )
     name = Column(String(256), unique=True, nullable=False)
     info = Column(Text)
     sql = Column(Text, nullable=True)
@@ -589,6 +671,25 @@ class TransformSavepoint(Base):
     transform = relationship('Transform', backref=_b('savepoint'))
 
 
+class TransformDaemonState(Base):
+    __tablename__ = 'transform_daemon_state'
+    transform_id = Column(Integer, ForeignKey('transform.id'), nullable=False, unique=True)
+    transform = relationship('Transform', backref=_b('daemon_state'))
+    failure_count = Column(Integer, nullable=False, default=0)
+    success_count = Column(Integer, nullable=False, default=0)
+    last_attempt_at = Column(DateTime)
+    next_attempt_at = Column(DateTime)
+    last_error = Column(Text)
+    try_day = Column(Date)
+    try_count = Column(Integer, nullable=False, default=0)
+
+
+class DaemonMember(Base):
+    __tablename__ = 'daemon_member'
+    member_id = Column(String(255), nullable=False, unique=True)
+    heartbeat_at = Column(DateTime, nullable=False)
+
+
 def delete_all_tables(engine, force: bool = False):
     if not force:
         word = input('Are you delete all tables (Y/n)')
@@ -602,6 +703,39 @@ def create_all_tables(engine):
     Base.metadata.create_all(engine)
 
 
-__all__ = ['create_all_tables', 'delete_all_tables', 'Base', 'Connection',
+def _add_column_ddl(engine, table: sa.Table, column: sa.Column) -> str:
+    ddl = 'ALTER TABLE {} ADD COLUMN {} {}'.format(table.name, column.name, column.type.compile(dialect=engine.dialect))
+    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+    if default is not None:
+        value = sa.literal(default, type_=column.type).compile(dialect=engine.dialect,
+                                                               compile_kwargs={"literal_binds": True})
+        ddl += ' DEFAULT {}'.format(value)
+        if not column.nullable:
+            ddl += ' NOT NULL'
+    return ddl
+
+
+def upgrade_tables(engine) -> List[str]:
+    Base.metadata.create_all(engine)
+    inspector = sa.inspect(engine)
+    created = []
+    for table in Base.metadata.sorted_tables:
+        columns = set(x['name'] for x in inspector.get_columns(table.name))
+        for column in table.columns:
+            if column.name not in columns:
+                logger.info("add column {} on {}".format(column.name, table.name))
+                engine.execute(_add_column_ddl(engine, table, column))
+                created.append('{}.{}'.format(table.name, column.name))
+        exists = set(x['name'] for x in inspector.get_indexes(table.name))
+        for index in sorted(table.indexes, key=lambda x: x.name):
+            if index.name not in exists:
+                logger.info("create index {} on {}".format(index.name, table.name))
+                index.create(engine)
+                created.append(index.name)
+    return created
+
+
+__all__ = ['create_all_tables', 'delete_all_tables', 'upgrade_tables', 'Base', 'Connection',
            'SchemaEvent', 'Connector', 'ResourceName', 'ResourceVersion', 'ResourceTemplate',
-           'Namespace', 'FileResource', 'Transform', 'Functions', 'TransformSavepoint', 'SaveDict']
+           'Namespace', 'FileResource', 'Transform', 'Functions', 'TransformSavepoint', 'TransformDaemonState',
+           'DaemonMember', 'SaveDict']
@@ -2,7 +2,8 @@
 from typing import Optional
 from fsqlfly.base_handle import BaseHandler
 from fsqlfly import settings
-from fsqlfly.common import DBRes
+from fsqlfly.common import DBRes, safe_authenticated
+from fsqlfly.utils.db_pool import get_pool_status
 
 is_login = False
 user = dict(code=200, name='admin', status='ok', currentAuthority='admin', type='password',
@@ -40,7 +41,14 @@ class LoginOutHandler(BaseHandler):
             self.write_json(user)
 
 
+class MetricsHandler(BaseHandler):
+    @safe_authenticated
+    def get(self):
+        self.write_res(DBRes(data=dict(db=get_pool_status(settings.ENGINE))))
+
+
 default_handlers = [
     (r'/api/login', LoginHandler),
     (r'/api/logout', LoginOutHandler),
+    (r'/api/metrics', MetricsHandler),
 ]
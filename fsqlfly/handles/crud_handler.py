@@ -1,11 +1,12 @@
 # -*- coding:utf-8 -*-
 from fsqlfly.common import safe_authenticated
 from fsqlfly.base_handle import BaseHandler
-from fsqlfly.db_helper import SUPPORT_MODELS, DBDao
+from fsqlfly.db_helper import SUPPORT_MODELS, DBDao, session_scope
 
 
 class APICounter(BaseHandler):
     @safe_authenticated
+    @session_scope
     def get(self):
         data = {k + 'Num': DBDao.count(v) for k, v in SUPPORT_MODELS.items()}
         data['code'] = 200
@@ -15,6 +16,7 @@ class APICounter(BaseHandler):
 
 class CRHandler(BaseHandler):
     @safe_authenticated
+    @session_scope
     def get(self, model: str):
         if model == 'require':
             return self.write_res(DBDao.get_require_name())
@@ -29,16 +31,19 @@ class CRHandler(BaseHandler):
         self.write_res(DBDao.get(model, filter_=filter_))
 
     @safe_authenticated
+    @session_scope
     def post(self, model: str):
         self.write_res(DBDao.create(model, self.json_body))
 
 
 class UDHandler(BaseHandler):
     @safe_authenticated
+    @session_scope
     def post(self, model: str, pk: int):
         self.write_res(DBDao.update(model, pk, self.json_body))
 
     @safe_authenticated
+    @session_scope
     def delete(self, model: str, pk: int):
         self.write_res(DBDao.delete(model, pk))
 
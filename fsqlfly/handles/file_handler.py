@@ -1,12 +1,19 @@
 # -*- coding:utf-8 -*-
 import os
+import glob
+import math
+import time
+import hashlib
 import magic
+from typing import Optional
 from tempfile import mkstemp
 import tornado.web
+from tornado import gen
 from fsqlfly.common import safe_authenticated
 from fsqlfly.base_handle import BaseHandler
 from fsqlfly.common import DBRes
-from fsqlfly.settings import UPLOAD_ROOT_DIR, FSQLFLY_JOB_LOG_FILE
+from fsqlfly.settings import UPLOAD_ROOT_DIR, FSQLFLY_JOB_LOG_FILE, FSQLFLY_UPLOAD_MAX_SIZE
+from fsqlfly.utils.files import parse_range, tail_offset, iter_file, MultipartStreamParser
 
 is_login = False
 user = dict(code=200, name='flink', status='ok', currentAuthority='admin', type='password',
@@ -17,44 +24,157 @@ upload_dirs = {x: os.path.join(UPLOAD_ROOT_DIR, x) for x in support_upload}
 _ = [os.makedirs(x, exist_ok=True) for x in upload_dirs.values()]
 
 FileMagic = magic.Magic(mime=True, uncompress=True)
+LOG_FOLLOW_MAX_WAIT = 60
+LOG_FOLLOW_CHECK_INTERVAL = 0.5
 
 
-class UploadHandler(BaseHandler):
+class StreamFileHandler(BaseHandler):
+    async def write_file(self, path: str, content_type: str, start: int = 0, end: Optional[int] = None):
+        size = os.path.getsize(path)
+        end = size if end is None else min(end, size)
+        self.set_header('content-type', content_type)
+        self.set_header('Accept-Ranges', 'bytes')
+        try:
+            byte_range = parse_range(self.request.headers.get('Range'), size)
+        except ValueError:
+            self.set_status(416)
+            self.set_header('Content-Range', 'bytes */{}'.format(size))
+            return self.finish()
+        if byte_range is not None:
+            start, end = byte_range
+            self.set_status(206)
+            self.set_header('Content-Range', 'bytes {}-{}/{}'.format(start, end - 1, size))
+        self.set_header('Content-Length', end - start)
+        for chunk in iter_file(path, start, end):
+            self.write(chunk)
+            await self.flush()
+        self.finish()
+
+
+class UploadReceiver:
+    def __init__(self, content_type: str):
+        boundary = MultipartStreamParser.get_boundary(content_type)
+        self.parser = MultipartStreamParser(boundary, self.begin, self.write, self.end) if boundary else None
+        self.key = self.filename = self.tem_f = self.out = self.hasher = None
+        self.real_path = None
+
+    def feed(self, chunk: bytes):
+        if self.parser is not None:
+            self.parser.feed(chunk)
+
+    def begin(self, headers: dict):
+        if self.tem_f is not None or not headers['filename'] or headers['name'] not in support_upload:
+            return
+        self.key = headers['name']
+        self.filename = os.path.basename(headers['filename'].replace('\\', '/'))
+        fd, self.tem_f = mkstemp(suffix='.uploading', dir=upload_dirs[self.key])
+        self.out = os.fdopen(fd, 'wb')
+        self.hasher = hashlib.sha256()
+
+    def write(self, data: bytes):
+        if self.out is not None:
+            self.out.write(data)
+            self.hasher.update(data)
+
+    def end(self):
+        if self.out is None:
+            return
+        self.out.close()
+        self.out = None
+        digest = self.hasher.hexdigest()
+        exists = glob.glob(os.path.join(upload_dirs[self.key], digest + '_*'))
+        if exists:
+            os.remove(self.tem_f)
+            target = exists[0]
+        else:
+            target = os.path.join(upload_dirs[self.key], '{}_{}'.format(digest, self.filename))
+            os.rename(self.tem_f, target)
+        self.tem_f = target
+        self.real_path = '/upload/' + self.key + '/' + os.path.basename(target)
+
+    def close(self):
+        if self.out is not None:
+            self.out.close()
+            self.out = None
+            os.remove(self.tem_f)
+
+
+@tornado.web.stream_request_body
+class UploadHandler(StreamFileHandler):
+    receiver = None
+
+    def prepare(self):
+        if self.request.method != 'POST':
+            return
+        if not self.current_user:
+            raise tornado.web.HTTPError(403)
+        self.request.connection.set_max_body_size(FSQLFLY_UPLOAD_MAX_SIZE)
+        self.receiver = UploadReceiver(self.request.headers.get('Content-Type', ''))
+
+    def data_received(self, chunk: bytes):
+        if self.receiver is not None:
+            self.receiver.feed(chunk)
+
+    def on_connection_close(self):
+        if self.receiver is not None:
+            self.receiver.close()
+
     @safe_authenticated
-    def get(self, path: str):
+    async def get(self, path: str):
         if not any(map(lambda x: path.startswith(x), support_upload)):
             raise tornado.web.HTTPError(status_code=404)
         full_path = os.path.join(UPLOAD_ROOT_DIR, path)
         if not os.path.exists(full_path):
             return self.write_res(DBRes.api_error())
         mime = FileMagic.from_file(full_path)
-        self.set_header('content-type', mime)
-        self.write(open(full_path, "rb").read())
-        self.finish()
+        await self.write_file(full_path, mime)
 
     @safe_authenticated
     def post(self):
-        files = self.request.files
-        key = list(files.keys())[0]
-        if key not in support_upload:
+        self.receiver.close()
+        if self.receiver.real_path is None:
             return self.write_res(DBRes.api_error())
-        upload_file = files[key][0]
+        return self.write_res(DBRes(data={"realPath": self.receiver.real_path}))
 
-        _, tem_f = mkstemp(suffix=upload_file.filename, dir=upload_dirs[key])
-        with open(tem_f, 'wb+') as out:
-            out.write(upload_file.body)
-        real_path = '/upload/' + key + '/' + os.path.basename(tem_f)
-        return self.write_res(DBRes(data={"realPath": real_path}))
 
+class LogHandler(StreamFileHandler):
+    async def follow(self, offset: int, timeout: float):
+        deadline = time.time() + min(timeout, LOG_FOLLOW_MAX_WAIT)
+        while True:
+            size = os.path.getsize(FSQLFLY_JOB_LOG_FILE)
+            if size < offset:
+                offset = 0
+            if size > offset or time.time() >= deadline:
+                break
+            await gen.sleep(LOG_FOLLOW_CHECK_INTERVAL)
+        self.set_header('X-Log-Offset', size)
+        await self.write_file(FSQLFLY_JOB_LOG_FILE, 'text', offset, size)
+
+    def get_number_argument(self, name: str, typ: type = int, default=None):
+        value = self.get_argument(name, None)
+        if value is None:
+            return default
+        try:
+            number = typ(value)
+        except ValueError:
+            number = None
+        if number is None or not math.isfinite(number) or number < 0:
+            raise tornado.web.HTTPError(400, "{} must be a non-negative number, got {!r}".format(name, value))
+        return number
 
-class LogHandler(BaseHandler):
     @safe_authenticated
-    def get(self):
+    async def get(self):
         if not os.path.exists(FSQLFLY_JOB_LOG_FILE):
             raise tornado.web.HTTPError(status_code=404)
-        self.set_header('content-type', 'text')
-        self.write(open(FSQLFLY_JOB_LOG_FILE, "rb").read())
-        self.finish()
+        offset = self.get_number_argument('offset')
+        tail = self.get_number_argument('tail')
+        timeout = self.get_number_argument('timeout', float, LOG_FOLLOW_MAX_WAIT)
+        if offset is not None:
+            return await self.follow(offset, timeout)
+        size = os.path.getsize(FSQLFLY_JOB_LOG_FILE)
+        self.set_header('X-Log-Offset', size)
+        await self.write_file(FSQLFLY_JOB_LOG_FILE, 'text', tail_offset(FSQLFLY_JOB_LOG_FILE, int(tail)) if tail else 0,
+                              size)
 
 
 class BlankHandler(BaseHandler):
@@ -7,12 +7,13 @@ from collections import defaultdict
 from fsqlfly.settings import FSQLFLY_FINK_HOST, TEMP_TERMINAL_HEAD
 from fsqlfly.base_handle import BaseHandler
 from fsqlfly.utils.job_manage import JobControlHandle, handle_job
-from fsqlfly.db_helper import DBDao
+from fsqlfly.db_helper import DBDao, session_scope
 from fsqlfly.common import DBRes
 
 
 class JobHandler(BaseHandler):
     @safe_authenticated
+    @session_scope
     def get(self, mode: str, pk: str):
         return self.write_res(handle_job(mode, pk, self.json_body))
 
@@ -33,6 +34,7 @@ def get_latest_transform(refresh_seconds: int = 5) -> Dict[str, dict]:
 
 class JobList(BaseHandler):
     @safe_authenticated
+    @session_scope
     def get(self):
         job_infos = get_latest_transform()
         all_jobs = list()
@@ -3,12 +3,14 @@ from fsqlfly.common import safe_authenticated
 from fsqlfly.base_handle import BaseHandler
 from fsqlfly.common import PageModelMode, PageModel
 from fsqlfly.version_manager.helpers.manager import ManagerHelper
+from fsqlfly.db_helper import session_scope
 
 
 class ManagerHandler(BaseHandler):
     @safe_authenticated
+    @session_scope
     def post(self, model: str, mode: str, pk: str):
-        return self.write_res(ManagerHelper.run(model, mode, pk))
+        return self.write_res(ManagerHelper.run(model, mode, pk, args=self.json_body))
 
 
 default_handlers = [
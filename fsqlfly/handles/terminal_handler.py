@@ -5,20 +5,21 @@ from fsqlfly import settings
 from fsqlfly.base_handle import BaseHandler
 from fsqlfly.workflow import run_debug_transform
 from fsqlfly.common import DBRes
-from fsqlfly.utils.job_manage import handle_job
-from fsqlfly.db_helper import DBDao
+from fsqlfly.utils.job_manage import handle_job, handle_bulk_status
+from fsqlfly.db_helper import DBDao, session_scope
+from fsqlfly.utils.terminal import TERMINAL_REAPER, touch_terminal
 
 
 class TerminalHandler(BaseHandler):
     @safe_authenticated
     def get(self):
-        tm = self.terminal_manager
-        terms = [{'name': name, 'id': name} for name in tm.terminals]
+        terms = [dict(x, id=x['name']) for x in TERMINAL_REAPER.get_usage() if not x['pooled']]
         self.write_res(DBRes(data=terms))
 
 
 class TransformControlHandler(BaseHandler):
     @safe_authenticated
+    @session_scope
     def post(self, mode: str, pk: str):
         if mode == 'debug':
             term = run_debug_transform(self.json_body, self.terminal_manager)
@@ -30,6 +31,13 @@ class TransformControlHandler(BaseHandler):
             return self.write_res(handle_job(mode, pk, self.json_body))
 
 
+class TransformBulkStatusHandler(BaseHandler):
+    @safe_authenticated
+    @session_scope
+    def post(self):
+        return self.write_res(handle_bulk_status(self.json_body))
+
+
 class TerminalStopHandler(BaseHandler):
     @safe_authenticated
     async def post(self, name: str):
@@ -49,11 +57,22 @@ class MyTermSocket(TermSocket):
         if hasattr(terminal, open_name) and getattr(terminal, open_name):
             setattr(terminal, open_name, False)
             self.term_manager.start_reading(terminal)
+        touch_terminal(terminal)
+
+    def on_message(self, message):
+        touch_terminal(self.terminal)
+        super(MyTermSocket, self).on_message(message)
+
+    def on_pty_read(self, text):
+        if self.terminal is not None:
+            touch_terminal(self.terminal)
+        super(MyTermSocket, self).on_pty_read(text)
 
 
 default_handlers = [
     (r'/api/terminal', TerminalHandler),
     (r"/_websocket/(\w+)", MyTermSocket, {'term_manager': settings.TERMINAL_MANAGER}),
     (r'/api/terminal/stop/(?P<name>\d+)', TerminalStopHandler),
+    (r'/api/transform/status', TransformBulkStatusHandler),
     (r'/api/transform/(\w+)/([0-9a-zA-Z_]+)', TransformControlHandler),
 ]
@@ -1,18 +1,22 @@
+import os
 import time
+import uuid
+import random
+import socket
 import logging
 import logzero
+from concurrent.futures import ThreadPoolExecutor, Future
 from tornado import ioloop
 from logzero import setup_logger
-from collections import defaultdict
-from typing import Callable, Optional
+from typing import Callable, Optional, List, Tuple, Set
 # from fsqlfly.models import Transform, auto_close
 from requests import Session
-from datetime import datetime, date
+from datetime import datetime, timedelta
 from fsqlfly.workflow import run_transform
 from fsqlfly.settings import FSQLFLY_DEBUG, FSQLFLY_MAIL_ENABLE
-from fsqlfly.utils.job_manage import JobControlHandle
+from fsqlfly.utils.job_manage import JobWatcher
 from fsqlfly.contrib.mail import MailHelper
-from fsqlfly.db_helper import DBSession, DBDao
+from fsqlfly.db_helper import DBSession, DBDao, Transform
 
 
 def get_log_file(file: str):
@@ -26,14 +30,32 @@ class FlinkJobDaemon:
                  flink_host: str,
                  max_try: int,
                  login_file: str,
-                 max_req_try: int = 5):
+                 max_req_try: int = 5,
+                 concurrency: int = 1,
+                 job_timeout: Optional[int] = None,
+                 namespace_priority: str = '',
+                 backoff_base: int = 30,
+                 backoff_max: int = 3600,
+                 member_ttl: int = 90,
+                 full_sync_every: int = 10):
         self.logger = get_log_file(login_file)
         self.flink_host = flink_host
         self.max_try = max_try
         self.max_req_try = max_req_try
         self.session = Session()
-        self.run_times = defaultdict(lambda: defaultdict(int))
-        self.started_jobs = set()
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.member_ttl = member_ttl
+        self.watcher = JobWatcher(flink_host)
+        self.full_sync_every = max(full_sync_every, 1)
+        self.ticks = 0
+        self.member_id = '{}-{}-{}'.format(socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
+        self.concurrency = max(concurrency, 1)
+        self.job_timeout = job_timeout if job_timeout else None
+        self.namespace_priority = [x.strip() for x in namespace_priority.split(',') if x.strip()]
+        self.dispatcher = ThreadPoolExecutor(max_workers=1)
+        self.workers = ThreadPoolExecutor(max_workers=self.concurrency)
+        self.recovery = None  # type: Optional[Future]
 
     def request(self, func: Callable, try_times: int = 0):
         try:
@@ -50,32 +72,111 @@ class FlinkJobDaemon:
         if FSQLFLY_MAIL_ENABLE:
             print(MailHelper.send(title, content))
 
-    def run(self):
+    def get_priority(self, transform: Transform) -> Tuple[int, str]:
+        namespace = transform.namespace.name if transform.namespace else None
+        if namespace in self.namespace_priority:
+            return self.namespace_priority.index(namespace), namespace
+        if namespace is None:
+            return len(self.namespace_priority) + 1, ''
+        return len(self.namespace_priority), namespace
+
+    def get_missing_jobs(self, session, names: Optional[Set[str]] = None,
+                         due_ids: Optional[Set[int]] = None) -> List[Tuple[str, Transform]]:
+        job_names = DBDao.get_job_names(session=session)
+        living_job = self.watcher.live_job_names
+        due_ids = due_ids if due_ids else set()
+        missing = [(k, transform) for k, transform in job_names.items()
+                   if k not in living_job and (names is None or k in names or transform.id in due_ids)]
+        missing.sort(key=lambda x: self.get_priority(x[1]))
+        return missing
+
+    def get_shard(self) -> Tuple[int, int]:
+        now = datetime.now()
+        members = DBDao.heartbeat_daemon_member(self.member_id, now, now - timedelta(seconds=self.member_ttl))
+        if not isinstance(members, list) or self.member_id not in members:
+            raise Exception('daemon member {} heartbeat fail: {}'.format(self.member_id, members))
+        return members.index(self.member_id), len(members)
+
+    def get_backoff(self, failure_count: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * 2 ** max(failure_count - 1, 0))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def is_eligible(self, state: Optional[dict], now: datetime) -> bool:
+        return state is None or state['next_attempt_at'] is None or state['next_attempt_at'] <= now
+
+    @classmethod
+    def load_transform(cls, transform_id: int) -> Optional[Transform]:
+        with DBSession.scope() as session:
+            transform = session.query(Transform).filter(Transform.id == transform_id).first()
+            if transform is not None:
+                session.expunge(transform)
+            return transform
+
+    def start_job(self, k: str, transform_id: int):
+        transform = self.load_transform(transform_id)
+        if transform is None:
+            self.logger.debug('job {} removed before start'.format(k))
+            return
+        now = datetime.now()
+        lease = self.job_timeout if self.job_timeout else self.backoff_max
+        state = DBDao.claim_daemon_state(transform.id, now, now + timedelta(seconds=lease))
+        if not isinstance(state, dict):
+            self.logger.debug('job {} claimed by other daemon or not ready'.format(k))
+            return
+        today = now.date()
+        try_count = state['try_count'] if state['try_day'] == today else 0
+        if try_count >= self.max_try:
+            tomorrow = datetime.combine(today + timedelta(days=1), datetime.min.time())
+            DBDao.update_daemon_state(transform.id, dict(next_attempt_at=tomorrow))
+            self.logger.error('job run too many times one day {}'.format(k))
+            self.send_email('job run too many times one day {}, next try at {}'.format(k, tomorrow))
+            return
+        DBDao.update_daemon_state(transform.id, dict(try_day=today, try_count=try_count + 1))
+        self.logger.info('job {} begin run '.format(k))
+        is_ok, r = run_transform(transform, timeout=self.job_timeout)
+        if not is_ok:
+            failure_count = state['failure_count'] + 1
+            next_attempt_at = datetime.now() + timedelta(seconds=self.get_backoff(failure_count))
+            DBDao.update_daemon_state(transform.id, dict(failure_count=failure_count, last_error=r,
+                                                         next_attempt_at=next_attempt_at))
+            self.send_email('job start fail {}'.format(k), r)
+            self.logger.error(r)
+        else:
+            DBDao.update_daemon_state(transform.id, dict(failure_count=0, success_count=state['success_count'] + 1,
+                                                         last_error=None, next_attempt_at=None))
+            if state['success_count'] > 0:
+                self.send_email('try restart job {}, last fail'.format(k), r)
+
+    def recover(self):
         self.logger.debug('Start Running Flink Job Damon {}'.format(str(datetime.now())[:19]))
 
-        today = str(date.today())
         start_time = time.time()
-        session = DBSession.get_session()
-        job_names = DBDao.get_job_names(session=session)
+        events = self.request(self.watcher.refresh)
+        full_sync = self.ticks % self.full_sync_every == 0
+        self.ticks += 1
+        names = None if full_sync else self.watcher.lost_job_names(events)
+        for event in events:
+            self.logger.debug('job {} {} -> {}'.format(event.name, event.old_status, event.new_status))
+        index, total = self.get_shard()
+        now = datetime.now()
+        due_ids = None if names is None else set(DBDao.get_due_daemon_transform_ids(now))
+        if names is not None and not names and not due_ids:
+            return
 
-        living_job = JobControlHandle.live_job_names
-        for k, transform in job_names.items():
-            if k not in living_job:
-                if self.run_times[today][k] > self.max_try:
-                    self.logger.error('job run too many times one day {}'.format(k))
-                    self.send_email('job run too many times one day {}'.format(k))
-                else:
-                    self.run_times[today][k] += 1
-                    self.logger.info('job {} begin run '.format(k))
-                    is_ok, r = run_transform(transform)
-                    if not is_ok:
-                        self.send_email('job start fail {}'.format(k), r)
-                        self.logger.error(r)
-                    else:
-                        if k in self.started_jobs:
-                            self.send_email('try restart job {}, last fail'.format(k), r)
-                        else:
-                            self.started_jobs.add(k)
+        session = DBSession.get_session()
+        try:
+            jobs = [(k, transform.id) for k, transform in self.get_missing_jobs(session, names, due_ids)
+                    if transform.id % total == index]
+        finally:
+            session.close()
+        states = DBDao.get_daemon_states([pk for _, pk in jobs]) if jobs else dict()
+        jobs = [(k, pk) for k, pk in jobs if self.is_eligible(states.get(pk), now)]
+        futures = [self.workers.submit(self.start_job, k, pk) for k, pk in jobs]
+        for (k, _), future in zip(jobs, futures):
+            try:
+                future.result()
+            except Exception as err:
+                self.logger.error('job {} recover meet {}'.format(k, err))
 
         end_time = time.time()
 
@@ -83,7 +184,25 @@ class FlinkJobDaemon:
 
         self.logger.debug(
             " ".join([str(datetime.now())[:19], ' damon cost ', '%.2f' % cost, ' second', ' will sleep ']))
-        session.close()
+
+    def stop(self):
+        DBDao.remove_daemon_member(self.member_id)
+        self.dispatcher.shutdown(wait=False)
+        self.workers.shutdown(wait=False)
+
+    def run(self):
+        if self.recovery is not None and not self.recovery.done():
+            self.logger.info('last job recovery still running, skip this time')
+            return
+        self.recovery = self.dispatcher.submit(self.recover)
+        self.recovery.add_done_callback(self.log_recovery)
+
+    def log_recovery(self, future: Future):
+        if future.cancelled():
+            return
+        err = future.exception()
+        if err is not None:
+            self.logger.error('job recovery meet {}'.format(err), exc_info=(type(err), err, err.__traceback__))
 
     def get_periodic_callback(self, period) -> Callable:
         def _warp():
@@ -7,12 +7,20 @@ from os.path import join, dirname, abspath
 
 def run_webserver(commands: list):
     extend_command = None
+    daemon = None
     if '--jobdaemon' in commands:
         from fsqlfly.job_manager.daemon import FlinkJobDaemon
         from fsqlfly import settings
         daemon = FlinkJobDaemon(settings.FSQLFLY_FINK_HOST,
                                 settings.FSQLFLY_JOB_DAEMON_MAX_TRY_ONE_DAY,
-                                settings.FSQLFLY_JOB_LOG_FILE)
+                                settings.FSQLFLY_JOB_LOG_FILE,
+                                concurrency=settings.FSQLFLY_JOB_DAEMON_CONCURRENCY,
+                                job_timeout=settings.FSQLFLY_JOB_DAEMON_JOB_TIMEOUT,
+                                namespace_priority=settings.FSQLFLY_JOB_DAEMON_NAMESPACE_PRIORITY,
+                                backoff_base=settings.FSQLFLY_JOB_DAEMON_BACKOFF_BASE,
+                                backoff_max=settings.FSQLFLY_JOB_DAEMON_BACKOFF_MAX,
+                                member_ttl=settings.FSQLFLY_JOB_DAEMON_MEMBER_TTL,
+                                full_sync_every=settings.FSQLFLY_JOB_DAEMON_FULL_SYNC_EVERY)
         extend_command = daemon.get_periodic_callback(settings.FSQLFLY_JOB_DAEMON_FREQUENCY)
         logzero.logger.debug('add job daemon command {}: {}: {}: {}'.format(settings.FSQLFLY_FINK_HOST,
                                                                             settings.FSQLFLY_JOB_DAEMON_MAX_TRY_ONE_DAY,
@@ -24,6 +32,9 @@ def run_webserver(commands: list):
         run_web(extend_command=extend_command)
     except KeyboardInterrupt:
         logzero.logger.info("Stop Web...")
+    finally:
+        if daemon is not None:
+            daemon.stop()
 
 
 def init_db(commands: list):
@@ -32,6 +43,13 @@ def init_db(commands: list):
     DBDao.create_all_tables()
 
 
+def upgrade_db(commands: list):
+    from fsqlfly.db_helper import DBDao
+
+    created = DBDao.upgrade_tables()
+    print('created: {}'.format(', '.join(created) if created else 'none'))
+
+
 def reset_db(commands: list):
     from fsqlfly.db_helper import DBDao
     conformed_parser = argparse.ArgumentParser("Conformed")
@@ -60,6 +78,7 @@ def main():
         "echoenv": run_echo_env,
         "webserver": run_webserver,
         "initdb": init_db,
+        "upgradedb": upgrade_db,
         "resetdb": reset_db,
         "runcanal": run_canal
     }
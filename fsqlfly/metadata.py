@@ -0,0 +1,214 @@
+# -*- coding:utf-8 -*-
+import time
+import threading
+from datetime import timedelta
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, Mapping, Optional, Tuple, Type, List
+import attr
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.session import object_session
+from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
+from sqlalchemy_utils import Choice
+from fsqlfly.db_models import (Base, Connection, ResourceName, ResourceTemplate, ResourceVersion, FileResource,
+                               Functions)
+
+SNAPSHOT_COLUMNS = {
+    Connection: ('name', 'type', 'is_active'),
+    ResourceName: ('name', 'full_name', 'is_active', 'connection_id'),
+    ResourceTemplate: ('name', 'full_name', 'is_default', 'connection_id', 'resource_name_id'),
+    ResourceVersion: ('name', 'full_name', 'is_default', 'connection_id', 'resource_name_id', 'template_id'),
+    FileResource: ('name', 'real_path'),
+    Functions: ('name', 'class_name', 'constructor_config', 'is_active', 'resource_id'),
+}
+SNAPSHOT_MODELS = tuple(SNAPSHOT_COLUMNS)
+SNAPSHOT_TABLES = {x.__tablename__: x for x in SNAPSHOT_MODELS}
+
+DEFAULT_FATHERS = ('template_id', 'resource_name_id')
+WATERMARK_MARGIN = timedelta(seconds=1)
+MISSING_BATCH_SIZE = 500
+
+Row = Mapping[str, object]
+Watermark = Tuple[Optional[object], int]
+
+
+@attr.s(frozen=True, slots=True)
+class TableSnapshot:
+    rows: Mapping[int, Row] = attr.ib(factory=lambda: MappingProxyType(dict()))
+    watermark: Watermark = attr.ib(default=(None, 0))
+    by_name: Mapping[str, Tuple[int, ...]] = attr.ib(factory=lambda: MappingProxyType(dict()))
+    by_full_name: Mapping[str, int] = attr.ib(factory=lambda: MappingProxyType(dict()))
+    defaults: Mapping[Tuple[str, int], int] = attr.ib(factory=lambda: MappingProxyType(dict()))
+
+    @classmethod
+    def build(cls, rows: Dict[int, Row], watermark: Watermark) -> 'TableSnapshot':
+        by_name, by_full_name, defaults = dict(), dict(), dict()
+        for pk in sorted(rows):
+            row = rows[pk]
+            by_name.setdefault(row['name'], []).append(pk)
+            if row.get('full_name') is not None:
+                by_full_name[row['full_name']] = pk
+            if row.get('is_default'):
+                for father_name in DEFAULT_FATHERS:
+                    if row.get(father_name) is not None:
+                        defaults.setdefault((father_name, row[father_name]), pk)
+        return cls(rows=MappingProxyType(rows), watermark=watermark,
+                   by_name=MappingProxyType({k: tuple(v) for k, v in by_name.items()}),
+                   by_full_name=MappingProxyType(by_full_name), defaults=MappingProxyType(defaults))
+
+    @classmethod
+    def to_row(cls, obj) -> Row:
+        return MappingProxyType({k: v.code if isinstance(v, Choice) else v for k, v in obj._asdict().items()})
+
+    def refresh(self, session: Session, model: Type[Base]) -> 'TableSnapshot':
+        latest, _ = self.watermark
+        columns = [getattr(model, x) for x in ('id', 'updated_at') + SNAPSHOT_COLUMNS[model]]
+        query = session.query(*columns)
+        if latest is not None:
+            query = query.filter(model.updated_at >= latest - WATERMARK_MARGIN)
+        changed = query.all()
+        ids = set(x for x, in session.query(model.id))
+        if not changed and ids == set(self.rows):
+            return self
+        rows = dict(self.rows)
+        missing = sorted(ids.difference(rows).difference(x.id for x in changed))
+        for i in range(0, len(missing), MISSING_BATCH_SIZE):
+            changed.extend(session.query(*columns).filter(model.id.in_(missing[i:i + MISSING_BATCH_SIZE])).all())
+        for obj in changed:
+            rows[obj.id] = self.to_row(obj)
+            if obj.updated_at is not None and (latest is None or obj.updated_at > latest):
+                latest = obj.updated_at
+        rows = {k: v for k, v in rows.items() if k in ids}
+        return self.build(rows, (latest, len(rows)))
+
+
+@attr.s(frozen=True, slots=True)
+class MetadataSnapshot:
+    tables: Mapping[str, TableSnapshot] = attr.ib()
+
+    def table(self, model: Type[Base]) -> TableSnapshot:
+        return self.tables[model.__tablename__]
+
+    def get(self, model: Type[Base], pk: Optional[int]) -> Optional[Row]:
+        return self.table(model).rows.get(pk)
+
+    def name2pk(self, model: Type[Base], name: str) -> int:
+        ids = self.table(model).by_name.get(name, tuple())
+        if not ids:
+            raise NoResultFound('No row was found for {} {}'.format(model.__tablename__, name))
+        if len(ids) > 1:
+            raise MultipleResultsFound('Multiple rows were found for {} {}'.format(model.__tablename__, name))
+        return ids[0]
+
+    def is_active(self, row: Row) -> bool:
+        connection = self.get(Connection, row['connection_id'])
+        resource_name = self.get(ResourceName, row['resource_name_id'])
+        return bool(connection and connection['is_active'] and resource_name and resource_name['is_active'])
+
+    def get_default_child(self, model: Type[Base], father_name: str, father_id: int) -> Optional[Row]:
+        return self.get(model, self.table(model).defaults.get((father_name, father_id)))
+
+    def find_version_ids(self, full_names: Iterable[str]) -> Dict[str, int]:
+        versions, templates = self.table(ResourceVersion), self.table(ResourceTemplate)
+        resource_names = self.table(ResourceName)
+        res = dict()
+        for full_name in full_names:
+            version = self.get(ResourceVersion, versions.by_full_name.get(full_name))
+            if version is None and full_name in templates.by_full_name:
+                version = self.get_default_child(ResourceVersion, 'template_id', templates.by_full_name[full_name])
+            if version is None and full_name in resource_names.by_full_name:
+                template = self.get_default_child(ResourceTemplate, 'resource_name_id',
+                                                  resource_names.by_full_name[full_name])
+                if template is not None:
+                    version = self.get_default_child(ResourceVersion, 'template_id', template['id'])
+            if version is not None:
+                res[full_name] = version['id']
+        return res
+
+    def get_require_name(self) -> List[str]:
+        versions = [x for _, x in sorted(self.table(ResourceVersion).rows.items()) if self.is_active(x)]
+        templates = [x for _, x in sorted(self.table(ResourceTemplate).rows.items()) if self.is_active(x)]
+        hive = [x['name'] for _, x in sorted(self.table(Connection).rows.items())
+                if x['is_active'] and x['type'] == 'hive']
+        return (hive + [x['full_name'] for x in versions] +
+                [self.get(ResourceTemplate, x['template_id'])['full_name'] for x in versions if x['is_default']] +
+                [self.get(ResourceName, x['resource_name_id'])['full_name'] for x in templates if x['is_default']])
+
+    def get_functions(self) -> List[Tuple[Row, Row]]:
+        return [(x, self.get(FileResource, x['resource_id'])) for _, x in sorted(self.table(Functions).rows.items())
+                if x['is_active']]
+
+
+class MetadataCache:
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self.snapshot = None  # type: Optional[MetadataSnapshot]
+        self.engine = None
+        self.checked_at = 0.0
+        self.dirty = True
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        self.dirty = True
+
+    def is_fresh(self, engine) -> bool:
+        return (self.snapshot is not None and self.engine is engine and not self.dirty and
+                time.monotonic() - self.checked_at < self.check_interval)
+
+    def get(self, engine, session_factory: Callable[[], Session]) -> MetadataSnapshot:
+        if self.is_fresh(engine):
+            return self.snapshot
+        with self.lock:
+            if self.is_fresh(engine):
+                return self.snapshot
+            old = self.snapshot.tables if self.snapshot is not None and self.engine is engine else dict()
+            self.dirty = False
+            session = session_factory()
+            try:
+                tables = {name: old.get(name, TableSnapshot()).refresh(session, model)
+                          for name, model in SNAPSHOT_TABLES.items()}
+            except Exception:
+                self.dirty = True
+                raise
+            finally:
+                session.close()
+            self.snapshot = MetadataSnapshot(tables=MappingProxyType(tables))
+            self.engine = engine
+            self.checked_at = time.monotonic()
+            return self.snapshot
+
+
+def _mark_session(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info['metadata_changed'] = True
+
+
+def _mark_update(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[x].history.has_changes() for x in SNAPSHOT_COLUMNS[mapper.class_]):
+        _mark_session(mapper, connection, target)
+
+
+def _mark_bulk(context):
+    if context.mapper.class_ in SNAPSHOT_MODELS:
+        context.session.info['metadata_changed'] = True
+
+
+def listen_metadata_change(cache: MetadataCache):
+    def _after_commit(session: Session):
+        if not session.transaction.nested and session.info.pop('metadata_changed', False):
+            cache.invalidate()
+
+    def _after_rollback(session: Session):
+        if not session.transaction.nested:
+            session.info.pop('metadata_changed', None)
+
+    for model in SNAPSHOT_MODELS:
+        event.listen(model, 'after_insert', _mark_session)
+        event.listen(model, 'after_update', _mark_update)
+        event.listen(model, 'after_delete', _mark_session)
+    event.listen(Session, 'after_bulk_update', _mark_bulk)
+    event.listen(Session, 'after_bulk_delete', _mark_bulk)
+    event.listen(Session, 'after_commit', _after_commit)
+    event.listen(Session, 'after_rollback', _after_rollback)
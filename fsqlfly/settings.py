@@ -8,6 +8,7 @@ from dotenv import load_dotenv
 from pathlib import Path
 from terminado.management import NamedTermManager
 from sqlalchemy import create_engine
+from fsqlfly.utils.db_pool import get_pool_kwargs, listen_pool
 
 
 def generate_cookie_secret(s: str, typ: str = '___cookie_secret') -> str:
@@ -45,7 +46,17 @@ FSQLFLY_COOKIE_SECRET = generate_cookie_secret(FSQLFLY_PASSWORD)
 FSQLFLY_DB_URL = ENV('FSQLFLY_DB_URL')
 
 assert FSQLFLY_DB_URL, 'FSQLFLY_DB_URL must not be null'
-ENGINE = create_engine(FSQLFLY_DB_URL, echo=FSQLFLY_DEBUG)
+FSQLFLY_DB_POOL_SIZE = int(ENV('FSQLFLY_DB_POOL_SIZE', '10'))
+FSQLFLY_DB_POOL_MAX_OVERFLOW = int(ENV('FSQLFLY_DB_POOL_MAX_OVERFLOW', '20'))
+FSQLFLY_DB_POOL_RECYCLE = int(ENV('FSQLFLY_DB_POOL_RECYCLE', '3600'))
+FSQLFLY_DB_POOL_TIMEOUT = int(ENV('FSQLFLY_DB_POOL_TIMEOUT', '30'))
+FSQLFLY_DB_POOL_PRE_PING = ENV('FSQLFLY_DB_POOL_PRE_PING', 'true').lower() not in ('0', 'false', 'no')
+ENGINE = create_engine(FSQLFLY_DB_URL, echo=FSQLFLY_DEBUG,
+                       **get_pool_kwargs(FSQLFLY_DB_URL, size=FSQLFLY_DB_POOL_SIZE,
+                                         max_overflow=FSQLFLY_DB_POOL_MAX_OVERFLOW, recycle=FSQLFLY_DB_POOL_RECYCLE,
+                                         timeout=FSQLFLY_DB_POOL_TIMEOUT, pre_ping=FSQLFLY_DB_POOL_PRE_PING))
+listen_pool(ENGINE)
+FSQLFLY_METADATA_CHECK_INTERVAL = float(ENV('FSQLFLY_METADATA_CHECK_INTERVAL', '5'))
 
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 FSQLFLY_UPLOAD_DIR = ENV('FSQLFLY_UPLOAD_DIR', join(os.path.expanduser('~'), '.fsqlfly_upload'))
@@ -53,11 +64,20 @@ if not os.path.exists(FSQLFLY_UPLOAD_DIR):
     logger.debug('Create Upload Base Dir {}'.format(FSQLFLY_UPLOAD_DIR))
     os.makedirs(FSQLFLY_UPLOAD_DIR)
 UPLOAD_ROOT_DIR = join(FSQLFLY_UPLOAD_DIR, 'upload')
+FSQLFLY_UPLOAD_MAX_SIZE = int(ENV('FSQLFLY_UPLOAD_MAX_SIZE', '2048')) * 1024 * 1024
 
 FSQLFLY_STATIC_ROOT = ENV('FSQLFLY_STATIC_ROOT', join(ROOT_DIR, 'static'))
 FSQLFLY_FINK_HOST = ENV('FSQLFLY_FINK_HOST', 'http://localhost:8081')
 FSQLFLY_JOB_DAEMON_FREQUENCY = int(ENV('FSQLFLY_JOB_DAEMON_FREQUENCY', '30'))
 FSQLFLY_JOB_DAEMON_MAX_TRY_ONE_DAY = int(ENV('FSQLFLY_JOB_DAEMON_MAX_TRY_ONE_DAY', '3'))
+FSQLFLY_JOB_DAEMON_CONCURRENCY = int(ENV('FSQLFLY_JOB_DAEMON_CONCURRENCY', '1'))
+FSQLFLY_JOB_DAEMON_JOB_TIMEOUT = int(ENV('FSQLFLY_JOB_DAEMON_JOB_TIMEOUT', '0'))
+FSQLFLY_JOB_DAEMON_NAMESPACE_PRIORITY = ENV('FSQLFLY_JOB_DAEMON_NAMESPACE_PRIORITY', '')
+FSQLFLY_JOB_DAEMON_BACKOFF_BASE = int(ENV('FSQLFLY_JOB_DAEMON_BACKOFF_BASE', str(FSQLFLY_JOB_DAEMON_FREQUENCY)))
+FSQLFLY_JOB_DAEMON_BACKOFF_MAX = int(ENV('FSQLFLY_JOB_DAEMON_BACKOFF_MAX', '3600'))
+FSQLFLY_CONNECTOR_START_PARALLELISM = int(ENV('FSQLFLY_CONNECTOR_START_PARALLELISM', '4'))
+FSQLFLY_JOB_DAEMON_FULL_SYNC_EVERY = int(ENV('FSQLFLY_JOB_DAEMON_FULL_SYNC_EVERY', '10'))
+FSQLFLY_JOB_DAEMON_MEMBER_TTL = int(ENV('FSQLFLY_JOB_DAEMON_MEMBER_TTL', str(FSQLFLY_JOB_DAEMON_FREQUENCY * 3)))
 
 assert os.path.exists(FSQLFLY_STATIC_ROOT), "FSQLFLY_STATIC_ROOT ({}) not set correct".format(FSQLFLY_STATIC_ROOT)
 INDEX_HTML_PATH = join(FSQLFLY_STATIC_ROOT, 'index.html')
@@ -70,6 +90,11 @@ assert os.path.exists(FSQLFLY_FLINK_BIN_DIR), "FSQLFLY_FLINK_BIN_DIR ({}) not ex
 FSQLFLY_FLINK_BIN = join(FSQLFLY_FLINK_BIN_DIR, 'sql-client.sh')
 
 FSQLFLY_FLINK_MAX_TERMINAL = int(ENV('FSQLFLY_FLINK_MAX_TERMINAL', '100'))
+FSQLFLY_TERMINAL_POOL_SIZE = int(ENV('FSQLFLY_TERMINAL_POOL_SIZE', '0'))
+FSQLFLY_TERMINAL_IDLE_TIMEOUT = int(ENV('FSQLFLY_TERMINAL_IDLE_TIMEOUT', '3600'))
+FSQLFLY_TERMINAL_MAX_AGE = int(ENV('FSQLFLY_TERMINAL_MAX_AGE', '86400'))
+FSQLFLY_TERMINAL_MEMORY_BUDGET = int(ENV('FSQLFLY_TERMINAL_MEMORY_BUDGET', '0'))
+FSQLFLY_TERMINAL_REAP_INTERVAL = int(ENV('FSQLFLY_TERMINAL_REAP_INTERVAL', '60'))
 FSQLFLY_WEB_PORT = int(ENV('FSQLFLY_WEB_PORT', '8082'))
 
 TERMINAL_MANAGER = NamedTermManager(
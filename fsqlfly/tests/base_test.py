@@ -10,8 +10,11 @@ class FSQLFlyTestCase(unittest.TestCase):
     def _fk_pragma_on_connect(self, dbapi_con, con_record):
         dbapi_con.execute('pragma foreign_keys=ON')
 
+    def create_engine(self):
+        return sa.create_engine('sqlite://', echo=True)
+
     def setUp(self) -> None:
-        engine = sa.create_engine('sqlite://', echo=True)
+        engine = self.create_engine()
         event.listen(engine, 'connect', self._fk_pragma_on_connect)
 
         DBSession.init_engine(engine)
@@ -0,0 +1,224 @@
+import os
+import time
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+import sqlalchemy as sa
+from unittest.mock import patch, PropertyMock, Mock
+from fsqlfly.db_helper import *
+from fsqlfly.tests.base_test import FSQLFlyTestCase
+from fsqlfly.utils.job_manage import JobWatcher
+from fsqlfly.job_manager import daemon as daemon_module
+from fsqlfly.job_manager.daemon import FlinkJobDaemon
+
+
+class DaemonTest(FSQLFlyTestCase):
+    def create_engine(self):
+        _, self.db_file = tempfile.mkstemp(suffix='.db')
+        return sa.create_engine('sqlite:///' + self.db_file, connect_args={'check_same_thread': False})
+
+    def tearDown(self) -> None:
+        super(DaemonTest, self).tearDown()
+        self.engine.dispose()
+        os.remove(self.db_file)
+
+    def get_daemon(self, **kwargs) -> FlinkJobDaemon:
+        _, log_file = tempfile.mkstemp(suffix='.log')
+        return FlinkJobDaemon('http://localhost:8081', 3, log_file, **kwargs)
+
+    def add_transforms(self):
+        low, high = Namespace(name='low', is_daemon=True), Namespace(name='high', is_daemon=True)
+        self.session.add_all([low, high,
+                              Transform(name='a', sql='', is_daemon=True, namespace=low),
+                              Transform(name='b', sql='', is_daemon=True),
+                              Transform(name='c', sql='', is_daemon=True, namespace=high),
+                              Transform(name='d', sql='', is_daemon=True, namespace=low)])
+        self.session.commit()
+
+    @classmethod
+    def watch(cls, live: set):
+        return patch.multiple(JobWatcher, refresh=lambda x: [],
+                              live_job_names=PropertyMock(return_value=live))
+
+    def test_recover_by_namespace_priority(self):
+        self.add_transforms()
+        daemon = self.get_daemon(namespace_priority='high')
+        started = []
+
+        def _run(transform, timeout=None, **kwargs):
+            started.append(transform.name)
+            return True, ''
+
+        with self.watch({'4_d'}), \
+                patch.object(daemon_module, 'run_transform', _run):
+            daemon.recover()
+        self.assertEqual(started, ['c', 'a', 'b'])
+
+    def test_worker_loads_own_transform(self):
+        self.add_transforms()
+        daemon = self.get_daemon(concurrency=2)
+        detached = []
+
+        def _run(transform, timeout=None, **kwargs):
+            detached.append(sa.inspect(transform).detached)
+            return True, transform.sql
+
+        with self.watch(set()), \
+                patch.object(daemon_module, 'run_transform', _run):
+            daemon.recover()
+        self.assertEqual(detached, [True] * 4)
+
+    def test_skip_tick_when_recovery_running(self):
+        self.add_transforms()
+        daemon = self.get_daemon(concurrency=4)
+        started = []
+
+        def _run(transform, timeout=None, **kwargs):
+            time.sleep(0.2)
+            started.append(transform.name)
+            return True, ''
+
+        with self.watch(set()), \
+                patch.object(daemon_module, 'run_transform', _run):
+            daemon.run()
+            recovery = daemon.recovery
+            daemon.run()
+            self.assertIs(daemon.recovery, recovery)
+            recovery.result(timeout=5)
+        self.assertEqual(sorted(started), ['a', 'b', 'c', 'd'])
+
+    def test_recovery_error_logged(self):
+        daemon = self.get_daemon()
+        daemon.logger = Mock()
+        with patch.multiple(JobWatcher, refresh=Mock(side_effect=ValueError('flink down'))):
+            daemon.max_req_try = 0
+            daemon.run()
+            self.assertRaises(ValueError, daemon.recovery.result, timeout=5)
+        daemon.dispatcher.shutdown(wait=True)
+        self.assertIn('flink down', daemon.logger.error.call_args[0][0])
+
+    def test_backoff_state_persisted(self):
+        self.add_transforms()
+        daemon = self.get_daemon(backoff_base=60, backoff_max=600)
+        started = []
+
+        def _run(transform, timeout=None, **kwargs):
+            started.append(transform.name)
+            return transform.name != 'b', 'fail'
+
+        with self.watch(set()), \
+                patch.object(daemon_module, 'run_transform', _run):
+            daemon.recover()
+            daemon.stop()
+            self.get_daemon(backoff_base=60, backoff_max=600).recover()
+        self.assertEqual(sorted(started), ['a', 'a', 'b', 'c', 'c', 'd', 'd'])
+
+        b = self.session.query(Transform).filter(Transform.name == 'b').one()
+        state = DBDao.get_daemon_states([b.id])[b.id]
+        self.assertEqual(state['failure_count'], 1)
+        self.assertEqual(state['last_error'], 'fail')
+        self.assertGreaterEqual(state['next_attempt_at'], state['last_attempt_at'] + timedelta(seconds=30))
+        self.assertEqual(self.session.query(TransformDaemonState).count(), 4)
+
+    def test_max_try_one_day(self):
+        self.add_transforms()
+        daemon = self.get_daemon(backoff_base=0, full_sync_every=1)
+        started = []
+
+        def _run(transform, timeout=None, **kwargs):
+            started.append(transform.name)
+            return transform.name != 'b', 'fail'
+
+        with self.watch({'1_a', '3_c', '4_d'}), \
+                patch.object(daemon_module, 'run_transform', _run):
+            for _ in range(5):
+                daemon.recover()
+        self.assertEqual(started, ['b'] * 3)
+
+        b = self.session.query(Transform).filter(Transform.name == 'b').one()
+        state = DBDao.get_daemon_states([b.id])[b.id]
+        self.assertEqual(state['try_count'], 3)
+        self.assertEqual(state['next_attempt_at'].date(), state['try_day'] + timedelta(days=1))
+
+    def test_shard_between_members(self):
+        self.add_transforms()
+        daemons = [self.get_daemon(), self.get_daemon()]
+        started = []
+
+        def _run(transform, timeout=None, **kwargs):
+            started.append(transform.name)
+            return True, ''
+
+        with self.watch(set()), \
+                patch.object(daemon_module, 'run_transform', _run):
+            for daemon in daemons:
+                daemon.get_shard()
+            self.assertEqual(sorted(x.get_shard() for x in daemons), [(0, 2), (1, 2)])
+            for daemon in daemons:
+                daemon.recover()
+            self.assertEqual(sorted(started), ['a', 'b', 'c', 'd'])
+
+            daemons[0].stop()
+            self.assertEqual(daemons[1].get_shard(), (0, 1))
+
+    def test_recover_only_lost_jobs(self):
+        self.add_transforms()
+        daemon = self.get_daemon(full_sync_every=10)
+        overview = {'jobs': [{'jid': str(i), 'name': '{}:x'.format(k), 'state': 'RUNNING', 'start-time': 1,
+                              'end-time': -1, 'duration': 1} for i, k in enumerate(['1_a', '2_b', '3_c', '4_d'])]}
+        started = []
+
+        def _run(transform, timeout=None, **kwargs):
+            started.append(transform.name)
+            return True, ''
+
+        response = Mock()
+        response.json = lambda: overview
+        daemon.watcher.session = Mock(get=Mock(return_value=response))
+        with patch.object(daemon_module, 'run_transform', _run):
+            daemon.recover()
+            self.assertEqual(started, [])
+            self.assertEqual(daemon.watcher.live_job_names, {'1_a', '2_b', '3_c', '4_d'})
+
+            overview['jobs'][1]['state'] = 'FAILED'
+            overview['jobs'].pop(2)
+            overview['jobs'].append(dict(overview['jobs'][0], jid='9', state='FAILED', **{'start-time': 2}))
+            daemon.recover()
+            self.assertEqual(sorted(started), ['b', 'c'])
+            self.assertEqual(daemon.watcher.jobs['1_a'].job_id, '0')
+
+            daemon.recover()
+            self.assertEqual(sorted(started), ['b', 'c'])
+
+    def test_quiet_tick_heartbeat_and_retry(self):
+        self.add_transforms()
+        daemon = self.get_daemon(backoff_base=0, full_sync_every=10)
+        started = []
+
+        def _run(transform, timeout=None, **kwargs):
+            started.append(transform.name)
+            return transform.name != 'b', 'fail'
+
+        with self.watch({'1_a', '3_c', '4_d'}), \
+                patch.object(daemon_module, 'run_transform', _run):
+            daemon.recover()
+            self.assertEqual(started, ['b'])
+            heartbeat_at = self.session.query(DaemonMember.heartbeat_at).scalar()
+            time.sleep(0.01)
+            daemon.recover()
+            self.assertEqual(started, ['b', 'b'])
+            self.assertGreater(self.session.query(DaemonMember.heartbeat_at).scalar(), heartbeat_at)
+
+            b = self.session.query(Transform).filter(Transform.name == 'b').one()
+            DBDao.update_daemon_state(b.id, dict(next_attempt_at=datetime.now() + timedelta(hours=1)))
+            daemon.recover()
+        self.assertEqual(started, ['b', 'b'])
+
+    def test_backoff_delay(self):
+        daemon = self.get_daemon(backoff_base=10, backoff_max=100)
+        for n, delay in [(1, 10), (2, 20), (4, 80), (10, 100)]:
+            self.assertTrue(delay / 2 <= daemon.get_backoff(n) <= delay)
+
+
+if __name__ == '__main__':
+    unittest.main()
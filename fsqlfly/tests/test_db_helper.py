@@ -117,7 +117,8 @@ class MyTestCase(FSQLFlyTestCase):
 
         session.add(t2_name)
         session.commit()
-        self.assertEqual(session.query(ResourceTemplate).filter(ResourceTemplate.is_default == True).count(), 1)
+        defaults = session.query(ResourceTemplate.id).filter(ResourceTemplate.is_default == True)
+        self.assertEqual(set(x for x, in defaults), {t2_name.id, t4_name.id})
         t1_name.is_default = True
         session.commit()
         self.assertEqual(session.query(ResourceTemplate).filter(ResourceTemplate.id == t1_name.id).first().is_default,
@@ -209,6 +210,39 @@ class MyTestCase(FSQLFlyTestCase):
         self.assertTrue(res.success)
         self.assertEqual(session.query(Transform).count(), 0)
 
+    def test_get_require_table_in_constant_queries(self):
+        session = DBSession.get_session()
+        connection = Connection(name='c', type='jdbc', url='xx', connector='')
+        session.add(connection)
+        for i in range(5):
+            r_name = ResourceName(name=f't{i}', database='db', connection=connection, full_name=f'c.db.t{i}')
+            template = ResourceTemplate(name='sink', type='sink', connection=connection, resource_name=r_name,
+                                        full_name=f'c.db.t{i}.sink', is_default=True)
+            version = ResourceVersion(name='latest', connection=connection, resource_name=r_name, template=template,
+                                      full_name=f'c.db.t{i}.sink.latest', is_default=True)
+            session.add_all([r_name, template, version])
+        session.commit()
+
+        DBDao.get_metadata()
+        statements = []
+
+        def _count(*args, **kwargs):
+            statements.append(args[2])
+
+        event.listen(self.engine, 'before_cursor_execute', _count)
+        try:
+            res = DBDao.get_require_table('c.db.t0,c.db.t1.sink,c.db.t2.sink.latest,c.db.t3,c.db.t4')
+            small = len(statements)
+            statements.clear()
+            DBDao.get_require_table('c.db.t0')
+        finally:
+            event.remove(self.engine, 'before_cursor_execute', _count)
+        self.assertEqual(len(res), 10)
+        self.assertEqual(set(x['name'] for x in res if '__' not in x['name']), {'t0', 't1', 't2', 't3', 't4'})
+        self.assertEqual(small, len(statements))
+        self.assertLessEqual(small, 1)
+        self.assertIsNone(DBDao.get_require_version_by_name('c.db.t5', session))
+
     def test_name2pk(self):
         session = DBSession.get_session()
         name = 'example1'
@@ -220,6 +254,117 @@ class MyTestCase(FSQLFlyTestCase):
         with self.assertRaises(Exception):
             DBDao.name2pk('connection', name='example2')
 
+    def test_metadata_snapshot(self):
+        from fsqlfly.db_helper import METADATA_CACHE
+        connection = Connection(name='a', type='hive', url='xx', connector='', is_active=True)
+        self.session.add(connection)
+        self.session.commit()
+        self.assertEqual(DBDao.get_require_name().data, ['a'])
+        connection.name = 'b'
+        self.session.commit()
+        self.assertEqual(DBDao.name2pk('connection', name='b'), connection.id)
+        self.assertEqual(set(DBDao.get_metadata().get(Connection, connection.id)),
+                         {'id', 'updated_at', 'name', 'type', 'is_active'})
+        self.session.add(SchemaEvent(name='s', database='db', connection=connection, fields='[]', version=1))
+        self.session.commit()
+        self.assertFalse(METADATA_CACHE.dirty)
+
+        self.engine.execute("insert into connection (name, type, url, connector, is_active, updated_at) "
+                            "values ('c', 'hive', 'xx', '', 1, '2999-01-01 00:00:00')")
+        self.assertEqual(DBDao.get_require_name().data, ['b'])
+        METADATA_CACHE.checked_at = 0
+        self.assertEqual(DBDao.get_require_name().data, ['b', 'c'])
+        self.engine.execute("delete from schema_event")
+        self.engine.execute("delete from connection where name = 'b'")
+        METADATA_CACHE.checked_at = 0
+        self.assertEqual(DBDao.get_require_name().data, ['c'])
+        self.engine.execute("delete from connection where name = 'c'")
+        self.engine.execute("insert into connection (name, type, url, connector, is_active, updated_at) "
+                            "values ('d', 'hive', 'xx', '', 1, '2000-01-01 00:00:00')")
+        METADATA_CACHE.checked_at = 0
+        self.assertEqual(DBDao.get_require_name().data, ['d'])
+
+    def test_metadata_fallback_in_scope(self):
+        with DBSession.scope() as session:
+            DBDao.get_metadata()
+            con = Connection(name='a', type='jdbc', url='xx', connector='')
+            r_name = ResourceName(name='t', database='db', full_name='a.db.t', connection=con)
+            template = ResourceTemplate(name='sink', type='sink', connection=con, resource_name=r_name,
+                                        full_name='a.db.t.sink', is_default=True)
+            version = ResourceVersion(name='v', version=1, connection=con, resource_name=r_name, template=template,
+                                      full_name='a.db.t.sink.v', is_default=True)
+            session.add_all([con, r_name, template, version])
+            session.flush()
+            self.assertEqual(DBDao.name2pk('connection', name='a'), con.id)
+            self.assertEqual(DBDao.get_require_versions_by_names(['a.db.t.sink.v', 'a.db.t', 'x'], session),
+                             {'a.db.t.sink.v': version, 'a.db.t': version})
+
+    def test_session_scope(self):
+        commits = []
+        with patch.object(DBSession, 'get_session', wraps=DBSession.get_session) as get_session:
+            with DBSession.scope() as session:
+                event.listen(session, 'after_commit', lambda x: commits.append(x))
+                self.assertTrue(DBDao.create('namespace', {'name': 'a'}).success)
+                self.assertEqual(len(DBDao.get('namespace').data), 1)
+                self.assertEqual(DBDao.count(Namespace), 1)
+                with DBSession.scope() as inner:
+                    self.assertIs(inner, session)
+                self.assertEqual(commits, [])
+        self.assertEqual(get_session.call_count, 1)
+        self.assertEqual(len(commits), 1)
+        self.assertIsNone(DBSession.current())
+
+        with self.assertRaises(ValueError):
+            with DBSession.scope():
+                DBDao.create('namespace', {'name': 'b'})
+                raise ValueError('rollback')
+        self.assertEqual(DBDao.count(Namespace), 1)
+
+        @session_scope
+        def post(handler):
+            handler.write_res(DBDao.create('namespace', {'name': 'c'}))
+            return handler.write_res(DBDao.create('namespace', {'name': 'a'}))
+
+        handler = Mock(_finished=False)
+        post(handler)
+        handler.clear.assert_called_once_with()
+        self.assertFalse(handler.write_res.call_args[0][0].success)
+        self.assertEqual(DBDao.count(Namespace), 1)
+        self.assertIsNone(DBSession.current())
+
+    def test_reset_default_batched(self):
+        connection = Connection(name='c', type='jdbc', url='xx', connector='')
+        templates = []
+        for i in range(3):
+            r_name = ResourceName(name=f't{i}', database='db', connection=connection, full_name=f'c.db.t{i}')
+            templates.append(ResourceTemplate(name='sink', type='sink', connection=connection, resource_name=r_name,
+                                              full_name=f'c.db.t{i}.sink', is_default=True))
+        self.session.add_all(templates)
+        self.session.commit()
+        statements = []
+
+        def _count(conn, cursor, statement, *args):
+            if statement.startswith('UPDATE resource_version'):
+                statements.append(statement)
+
+        event.listen(self.engine, 'before_cursor_execute', _count)
+        try:
+            self.session.add_all([ResourceVersion(name=str(i), version=i, connection=connection, template=x,
+                                                  resource_name=x.resource_name, full_name=f'{x.full_name}.{i}')
+                                  for x in templates for i in range(3)])
+            self.session.commit()
+            self.assertEqual(statements, [])
+            self.session.add_all([ResourceVersion(name=str(i), version=10 + i, connection=connection, template=x,
+                                                  is_default=True, resource_name=x.resource_name,
+                                                  full_name=f'{x.full_name}.d{i}')
+                                  for x in templates for i in range(2)])
+            self.session.commit()
+            self.assertEqual(len(statements), 1)
+        finally:
+            event.remove(self.engine, 'before_cursor_execute', _count)
+        defaults = self.session.query(ResourceVersion).filter(ResourceVersion.is_default == True).all()
+        self.assertEqual(sorted(x.full_name for x in defaults), [f'c.db.t{i}.sink.d1' for i in range(3)])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,4 +1,6 @@
+import attr
 import unittest
+import sqlalchemy as sa
 from unittest.mock import patch
 from fsqlfly.db_helper import *
 from fsqlfly.tests.base_test import FSQLFlyTestCase
@@ -98,6 +100,57 @@ insert_primary_key = true
         self.assertTrue(r_name.get_config('insert_primary_key', 'jdbc', bool))
         self.assertTrue(not connection.get_config('insert_primary_key', 'jdbc', bool))
 
+    def test_schema_fields(self):
+        from fsqlfly.common import SchemaField
+        from fsqlfly.utils.strings import dump_yaml
+        from fsqlfly.db_models import dump_schema_fields
+        fields = [SchemaField(name='id', type='BIGINT', nullable=False, autoincrement=True),
+                  SchemaField(name='name', type='STRING', comment='名字')]
+        legacy = SchemaEvent(name='a', fields=dump_yaml([attr.asdict(x) for x in fields]))
+        compact = SchemaEvent(name='a', fields=dump_schema_fields(fields))
+        self.assertEqual(legacy.schema_fields, tuple(fields))
+        self.assertEqual(compact.schema_fields, tuple(fields))
+        self.assertIs(compact.schema_fields, compact.schema_fields)
+        self.assertEqual(SchemaEvent(name='b', fields=compact.fields).schema_fields, tuple(fields))
+        self.assertEqual(SchemaEvent(name='c').schema_fields, tuple())
+        with self.assertRaises(attr.exceptions.FrozenInstanceError):
+            compact.schema_fields[0].name = 'changed'
+
+    def test_parsed_config_cache(self):
+        connection = Connection(name='a', url='#', type='jdbc', connector='text', config='[jdbc]\nread_partition_num=3')
+        r_name = ResourceName(name='b', full_name='a.b', connection=connection)
+        self.assertIs(connection.get_parsed_config(), connection.get_parsed_config())
+        self.assertEqual(r_name.get_config('read_partition_num', typ=int), 3)
+
+        parser = r_name.get_config_parser()
+        parser['jdbc']['read_partition_num'] = '10'
+        self.assertEqual(r_name.get_config('read_partition_num', typ=int), 3)
+
+        r_name.config = '[jdbc]\nread_partition_num=5'
+        self.assertEqual(r_name.get_config('read_partition_num', typ=int), 5)
+        self.assertEqual(connection.get_config('read_partition_num', typ=int), 3)
+        self.assertEqual(Connection.get_default_config_parser()['jdbc'].getint('read_partition_num'), 50)
+
+    def test_upgrade_tables(self):
+        index = [x for x in ResourceVersion.__table__.indexes if x.name == 'ix_resource_version_connection'][0]
+        index.drop(self.engine)
+        self.assertEqual(DBDao.upgrade_tables(), ['ix_resource_version_connection'])
+        self.assertEqual(DBDao.upgrade_tables(), [])
+
+    def test_upgrade_tables_add_columns(self):
+        self.session.add(Transform(name='a', sql=''))
+        self.session.commit()
+        TransformDaemonState.__table__.drop(self.engine)
+        old = sa.Table('transform_daemon_state', sa.MetaData(),
+                       *[x.copy() for x in TransformDaemonState.__table__.columns if not x.name.startswith('try_')])
+        old.create(self.engine)
+        self.engine.execute(old.insert().values(transform_id=1, failure_count=0, success_count=0))
+        created = DBDao.upgrade_tables()
+        self.assertIn('transform_daemon_state.try_day', created)
+        self.assertIn('transform_daemon_state.try_count', created)
+        self.assertEqual(DBDao.get_daemon_states([1])[1]['try_count'], 0)
+        self.assertEqual(DBDao.upgrade_tables(), [])
+
 
 if __name__ == '__main__':
     unittest.main()
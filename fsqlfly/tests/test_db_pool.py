@@ -0,0 +1,39 @@
+import os
+import tempfile
+import unittest
+import sqlalchemy as sa
+from fsqlfly.utils.db_pool import TimedQueuePool, get_pool_kwargs, listen_pool, get_pool_status
+
+
+class DBPoolTest(unittest.TestCase):
+    def test_pool_kwargs(self):
+        kwargs = get_pool_kwargs('mysql://u:p@localhost/db', size=5, max_overflow=1, recycle=60, timeout=3,
+                                 pre_ping=True)
+        self.assertIs(kwargs['poolclass'], TimedQueuePool)
+        self.assertEqual((kwargs['pool_size'], kwargs['max_overflow'], kwargs['pool_timeout']), (5, 1, 3))
+        self.assertEqual(get_pool_kwargs('sqlite://', 5, 1, 60, 3, False), dict(pool_pre_ping=False, pool_recycle=60))
+
+    def test_pool_metrics(self):
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        engine = sa.create_engine('sqlite:///' + path, poolclass=TimedQueuePool, pool_size=1, max_overflow=0,
+                                  pool_timeout=0.1, pool_pre_ping=True)
+        listen_pool(engine)
+        try:
+            conn = engine.connect()
+            with self.assertRaises(sa.exc.TimeoutError):
+                engine.connect()
+            status = get_pool_status(engine)
+            self.assertEqual((status['checked_out'], status['checkouts'], status['timeouts']), (1, 1, 1))
+            self.assertGreaterEqual(status['wait_max'], 0.1)
+            conn.close()
+            engine.connect().close()
+            status = get_pool_status(engine)
+            self.assertEqual((status['checked_out'], status['checkins'], status['connects']), (0, 2, 1))
+        finally:
+            engine.dispose()
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
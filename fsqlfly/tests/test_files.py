@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+from fsqlfly.utils.files import parse_range, tail_offset, iter_file, MultipartStreamParser, JarStore
+
+
+class FilesTest(unittest.TestCase):
+    def setUp(self) -> None:
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        with open(self.path, 'wb') as f:
+            f.write(b''.join(b'line %d\n' % i for i in range(1000)))
+        self.data = open(self.path, 'rb').read()
+
+    def tearDown(self) -> None:
+        os.remove(self.path)
+
+    def test_parse_range(self):
+        self.assertIsNone(parse_range(None, 100))
+        self.assertIsNone(parse_range('items=1-2', 100))
+        self.assertEqual(parse_range('bytes=10-19', 100), (10, 20))
+        self.assertEqual(parse_range('bytes=10-', 100), (10, 100))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 100))
+        self.assertEqual(parse_range('bytes=90-200', 100), (90, 100))
+        with self.assertRaises(ValueError):
+            parse_range('bytes=100-', 100)
+
+    def test_tail_offset(self):
+        lines = self.data.splitlines(keepends=True)
+        for n in (0, 1, 3, 999, 1000, 2000):
+            expected = b''.join(lines[-n:]) if n else b''
+            self.assertEqual(self.data[tail_offset(self.path, n, chunk_size=16):], expected)
+
+    def test_iter_file(self):
+        self.assertEqual(b''.join(iter_file(self.path, chunk_size=7)), self.data)
+        self.assertEqual(b''.join(iter_file(self.path, 5, 105, chunk_size=7)), self.data[5:105])
+
+    def test_multipart_stream_parser(self):
+        content_type = 'multipart/form-data; boundary="----abc"'
+        boundary = MultipartStreamParser.get_boundary(content_type)
+        self.assertEqual(boundary, b'----abc')
+        self.assertIsNone(MultipartStreamParser.get_boundary('application/json'))
+        body = (b'------abc\r\nContent-Disposition: form-data; name="a"\r\n\r\nvalue\r\n'
+                b'------abc\r\nContent-Disposition: form-data; name="file"; filename="x.jar"\r\n\r\n' + self.data +
+                b'\r\n------abc--\r\n')
+        for size in (1, 7, 4096, len(body)):
+            parts = []
+            parser = MultipartStreamParser(boundary, lambda h: parts.append([h['name'], h['filename'], b'']),
+                                           lambda d: parts[-1].__setitem__(2, parts[-1][2] + d), lambda: None)
+            for i in range(0, len(body), size):
+                parser.feed(body[i:i + size])
+            self.assertTrue(parser.finished)
+            self.assertEqual(parts, [['a', None, b'value'], ['file', 'x.jar', self.data]])
+
+    def test_jar_store(self):
+        import shutil
+        import hashlib
+        copy = self.path + '.copy'
+        shutil.copy(self.path, copy)
+        named = os.path.join(os.path.dirname(self.path), hashlib.sha256(self.data).hexdigest() + '_udf.jar')
+        store = JarStore()
+        try:
+            self.assertEqual(store.get_hash(copy), hashlib.sha256(self.data).hexdigest())
+            self.assertEqual(store.get_args([self.path, copy, named, '/not/exists']),
+                             ['-j', self.path, '-j', '/not/exists'])
+        finally:
+            os.remove(copy)
+
+
+if __name__ == '__main__':
+    unittest.main()
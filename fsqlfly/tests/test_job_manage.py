@@ -0,0 +1,32 @@
+import unittest
+from unittest.mock import patch, Mock
+from fsqlfly.db_helper import *
+from fsqlfly.tests.base_test import FSQLFlyTestCase
+from fsqlfly.utils.job_manage import JobControlHandle, handle_bulk_status
+
+
+class JobManageTest(FSQLFlyTestCase):
+    def get_overview(self, *jobs):
+        response = Mock()
+        response.json = lambda: {'jobs': [{'jid': jid, 'name': name, 'state': state, 'start-time': 1,
+                                           'end-time': -1, 'duration': 1} for jid, name, state in jobs]}
+        return Mock(get=Mock(return_value=response))
+
+    def test_bulk_status_one_snapshot(self):
+        self.session.add_all([Transform(name='a', sql=''), Transform(name='b', sql='')])
+        self.session.commit()
+        session = self.get_overview(('j1', '1_a:x', 'RUNNING'), ('j2', '2_b:x', 'FAILED'))
+        with patch.object(JobControlHandle, 'session', session):
+            res = handle_bulk_status({'jobs': [{'name': 'a'}, {'name': '2'}, {'name': 'c'},
+                                               {'name': 'b', 'last_run_job_id': 'j2'}]})
+        self.assertTrue(res.success)
+        self.assertEqual([x['msg'] for x in res.data[:2]], ['j1_RUNNING', 'FAILED'])
+        self.assertFalse(res.data[2]['success'])
+        self.assertEqual(res.data[3]['msg'], 'FAILED')
+        self.assertEqual(session.get.call_count, 1)
+
+        self.assertFalse(handle_bulk_status({}).success)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,7 @@
 from __future__ import absolute_import, unicode_literals, print_function
 import unittest
 from sqlalchemy import create_engine
+from sqlalchemy.orm import object_session
 from fsqlfly.db_helper import *
 from fsqlfly.common import *
 from fsqlfly.version_manager.helpers.manager import ManagerHelper
@@ -107,6 +108,109 @@ class ManagerTest(FSQLFlyTestCase):
         res = ManagerHelper.run(PageModel.connector, PageModelMode.list, con.id)
         self.assertEqual(res.success, True)
 
+    def test_manager_start(self):
+        from unittest.mock import patch
+        from fsqlfly.version_manager.manager import init as init_module
+        con = Connection(name='src', url='#', type=FlinkConnectorType.jdbc, connector='')
+        sink = Connection(name='sink', url='#', type=FlinkConnectorType.jdbc, connector='')
+        connector = Connector(name='connector', type=ConnectorType.system, source=con, target=sink)
+        names = [ResourceName(name='t{}'.format(i), database='db', full_name='src.db.t{}'.format(i), connection=con)
+                 for i in range(3)]
+        self.session.add_all([con, sink, connector] + names)
+        self.session.commit()
+        self.session.add_all([Transform(name=connector.get_transform_name_format(resource_name=x), sql='', require='')
+                              for x in names])
+        self.session.commit()
+        started = []
+
+        def _run(transform, shared=None, **kwargs):
+            started.append((transform.name, kwargs['pt']))
+            self.assertIsNotNone(shared)
+            self.assertIsNone(object_session(transform))
+            return True, 'Job ID: {}'.format(str(transform.id) * 32)
+
+        with patch.object(init_module, 'run_transform', _run):
+            res = ManagerHelper.run(PageModel.connector, PageModelMode.start, connector.id,
+                                    args={'parallelism': 2, 'pt': '20200101'})
+        self.assertTrue(res.success)
+        self.assertEqual(len(started), 3)
+        self.assertEqual(sorted(x['job_ids'][0] for x in res.data), ['1' * 32, '2' * 32, '3' * 32])
+
+        res = ManagerHelper.run(PageModel.connector, PageModelMode.start, connector.id, args={'timeout': 1})
+        self.assertFalse(res.success)
+
+        self.session.delete(self.session.query(Transform).first())
+        self.session.commit()
+        res = ManagerHelper.run(PageModel.connector, PageModelMode.start, connector.id)
+        self.assertFalse(res.success)
+
+    def test_manager_bundle_groups(self):
+        from fsqlfly.version_manager.dao import Dao
+        from fsqlfly.version_manager.manager.init import ConnectorInitTransformManager
+        con = Connection(name='src', url='#', type=FlinkConnectorType.jdbc, connector='')
+        sink = Connection(name='sink', url='#', type=FlinkConnectorType.jdbc, connector='')
+        connector = Connector(name='connector', type=ConnectorType.system, source=con, target=sink,
+                              config='[system]\nbundle_size = 2')
+        names = [ResourceName(name='t{}'.format(i), database='db', full_name='src.db.t{}'.format(i), connection=con)
+                 for i in range(4)]
+        self.session.add_all([con, sink, connector] + names)
+        self.session.commit()
+        manager = ConnectorInitTransformManager(connector, Dao())
+        groups = dict(manager.get_transform_groups(names[2::-1]))
+        self.assertEqual({k: [y.name for y in v] for k, v in groups.items()},
+                         {'jdbc2jdbc__connector__bundle_0': ['t0', 't1'], 'jdbc2jdbc__connector__bundle_1': ['t2']})
+
+        added = dict(manager.get_transform_groups(names))
+        changed = [k for k in set(groups) | set(added) if groups.get(k) != added.get(k)]
+        self.assertEqual(changed, ['jdbc2jdbc__connector__bundle_1'])
+        self.assertIn(names[3], added[changed[0]])
+
+        bundles = ['jdbc2jdbc__connector__bundle_{}'.format(i) for i in range(4)]
+        transforms = [Transform(name=x, sql='', connector=connector) for x in ['keep'] + bundles]
+        self.session.add_all(transforms + [TransformSavepoint(name='s', path='/tmp', transform=transforms[-1])])
+        self.session.commit()
+        self.assertEqual(manager.get_stale_bundle_names(bundles[:2]), bundles[2:])
+        self.assertEqual(Dao().delete_transforms(connector, bundles[2:]), 1)
+        self.assertEqual([x.name for x in self.session.query(Transform).all()], ['keep'] + bundles[:2] + bundles[3:])
+        self.assertEqual(manager.build_statement_set(['a;', 'b;']), 'BEGIN STATEMENT SET;\na;\nb;\nEND;')
+        self.assertEqual(manager.build_statement_set(['a;']), 'a;')
+
+    def test_bulk_clean(self):
+        from sqlalchemy import event
+        from fsqlfly.version_manager.dao import Dao
+        con = Connection(name='src', url='#', type=FlinkConnectorType.jdbc, connector='')
+        other = Connection(name='other', url='#', type=FlinkConnectorType.jdbc, connector='')
+        connector = Connector(name='connector', type=ConnectorType.system, source=con, target=other)
+        objects = [con, other, connector]
+        for c in [con, other]:
+            for i in range(5):
+                r_name = ResourceName(name='t{}'.format(i), database='db', full_name='{}.db.t{}'.format(c.name, i),
+                                      connection=c)
+                template = ResourceTemplate(name='sink', type='sink', connection=c, resource_name=r_name,
+                                            full_name=r_name.full_name + '.sink')
+                objects.extend([r_name, template] + [
+                    ResourceVersion(name=str(v), version=v, connection=c, resource_name=r_name, template=template,
+                                    full_name='{}.{}'.format(template.full_name, v)) for v in range(3)])
+        transforms = [Transform(name='job{}'.format(i), sql='', connector=connector) for i in range(3)]
+        objects.extend(transforms + [TransformSavepoint(name='s', path='/tmp', transform=transforms[0]),
+                                     TransformDaemonState(transform=transforms[1])])
+        self.session.add_all(objects + [Transform(name='other', sql='')])
+        self.session.commit()
+        statements = []
+        event.listen(self.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+        dao = Dao()
+        try:
+            res = dao.clean_connection(dao.session.query(Connection).get(con.id))
+            self.assertEqual(res.data, dict(resource_name=5, resource_template=5, resource_version=15))
+            self.assertLessEqual(len([x for x in statements if x.startswith('DELETE')]), 3)
+            res = dao.clean_connector(dao.session.query(Connector).get(connector.id))
+            self.assertEqual(res.data, dict(transform=3, transform_savepoint=1, transform_daemon_state=1))
+        finally:
+            dao.finished()
+        self.assertEqual(self.session.query(ResourceVersion).count(), 15)
+        self.assertEqual(self.session.query(ResourceName).count(), 5)
+        self.assertEqual([x.name for x in self.session.query(Transform).all()], ['other'])
+
     def init_test_connection(self):
         from fsqlfly.settings import FSQLFLY_DB_URL
         con = Connection(name='fake', url=FSQLFLY_DB_URL, type=FlinkConnectorType.jdbc, connector='',
@@ -0,0 +1,32 @@
+import unittest
+from fsqlfly.utils.strings import load_yaml, dump_yaml, load_yaml_cached, get_used_functions
+
+
+class MyTestCase(unittest.TestCase):
+    def test_yaml_convert(self):
+        data = {'update_mode': 'append', 'format': {'derive_schema': True, 'none': None}, 'schema': [{'data_type': 'INT'}]}
+        text = dump_yaml(data)
+        self.assertIn('update-mode', text)
+        self.assertNotIn('none', text)
+        self.assertEqual(load_yaml(text), {'update_mode': 'append', 'format': {'derive_schema': True},
+                                           'schema': [{'data_type': 'INT'}]})
+        self.assertEqual(load_yaml(text, to_underline=False)['update-mode'], 'append')
+
+    def test_load_yaml_cached(self):
+        text = dump_yaml([{'name': 'a', 'type': 'INT'}])
+        self.assertIs(load_yaml_cached(text), load_yaml_cached(text))
+        self.assertEqual(load_yaml_cached(text), load_yaml(text))
+
+    def test_get_used_functions(self):
+        sql = """
+        -- select unused_a(x)
+        /* unused_b(x) */
+        INSERT INTO t SELECT Parse_Json(msg), 'unused_c(1)', `to_ts` (ts), cat.db.my_udf(x) FROM s
+        """
+        names = ['parse_json', 'unused_a', 'unused_b', 'unused_c', 'TO_TS', 'my_udf', 'msg']
+        self.assertEqual(get_used_functions(sql, names), {'parse_json', 'TO_TS', 'my_udf'})
+        self.assertEqual(get_used_functions(None, names), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import stat
+import tempfile
+import unittest
+from unittest.mock import patch
+from terminado.management import NamedTermManager
+from fsqlfly import settings
+from fsqlfly.utils import terminal as terminal_module
+from fsqlfly.utils.terminal import TerminalPool, TerminalReaper, start_terminal, get_tree_rss
+
+
+class TerminalPoolTest(unittest.TestCase):
+    def setUp(self) -> None:
+        fd, self.bin = tempfile.mkstemp(suffix='.sh')
+        os.close(fd)
+        with open(self.bin, 'w') as f:
+            f.write('#!/bin/sh\nexec cat\n')
+        os.chmod(self.bin, stat.S_IRWXU)
+        self.manager = NamedTermManager(shell_command=[self.bin], max_terminals=3)
+
+    def tearDown(self) -> None:
+        for term in self.manager.terminals.values():
+            term.ptyproc.terminate(force=True)
+        os.remove(self.bin)
+
+    def test_acquire_warm_terminal(self):
+        pool = TerminalPool(self.manager, 1, max_environments=2)
+        with patch.object(settings, 'FSQLFLY_FLINK_BIN', self.bin):
+            self.assertIsNone(pool.acquire('a', []))
+            pool.refill()
+            self.assertEqual(len(self.manager.terminals), 1)
+            name = pool.acquire('a', [])
+            self.assertIn(name, self.manager.terminals)
+            self.assertFalse(pool.is_idle(name))
+
+            pool.refill()
+            self.assertEqual(len(self.manager.terminals), 2)
+            pool.acquire('b', ['-j', 'x.jar'])
+            pool.refill()
+            self.assertEqual(len(self.manager.terminals), 3)
+            pool.acquire('c', [])
+            self.assertEqual(len(self.manager.terminals), 2)
+            pool.refill()
+            self.assertEqual(len(self.manager.terminals), 3)
+            self.assertEqual(len(pool.environments), 2)
+            self.assertEqual(len(pool.idle[list(pool.environments)[-1]]), 1)
+
+    def test_reaper(self):
+        pool = TerminalPool(self.manager, 1)
+        reaper = TerminalReaper(self.manager, pool, idle_timeout=60, max_age=600)
+        with patch.object(settings, 'FSQLFLY_FLINK_BIN', self.bin):
+            pool.acquire('a', [])
+            pool.refill()
+            old, new = start_terminal(self.manager, 'b', []), start_terminal(self.manager, 'b', [])
+        self.assertGreater(get_tree_rss([os.getpid()])[os.getpid()], 0)
+        usage = {x['name']: x for x in reaper.get_usage()}
+        self.assertEqual(len(usage), 3)
+        self.assertEqual(sum(x['pooled'] for x in usage.values()), 1)
+
+        self.manager.terminals[old].last_active -= 120
+        self.assertEqual(reaper.reap(), [old])
+        self.assertEqual(len(self.manager.terminals), 2)
+
+        reaper.memory_budget = 150
+        with patch.object(terminal_module, 'get_tree_rss', lambda pids: {x: 100 for x in pids}):
+            evicted = reaper.reap()
+        self.assertEqual(len(evicted), 1)
+        self.assertTrue(pool.is_idle(evicted[0]) or evicted[0] not in self.manager.terminals)
+        self.assertEqual(list(self.manager.terminals), [new])
+        self.assertTrue(pool.paused)
+        pool.refill()
+        self.assertEqual(list(self.manager.terminals), [new])
+
+        self.manager.terminals[new].created_at -= 601
+        reaper.memory_budget = 1024 ** 3
+        self.assertEqual(reaper.reap(), [new])
+        self.assertFalse(pool.paused)
+
+
+if __name__ == '__main__':
+    unittest.main()
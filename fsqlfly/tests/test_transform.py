@@ -43,6 +43,43 @@ topic: {real_topic}
         self.assertEqual(cache2['connector']['topic'], 'dd__b2__d')
         self.assertEqual(cache['connector']['topic'], real_topic)
 
+    def test_template_compile_once(self):
+        from fsqlfly.utils.template import get_template, render_template
+        source = 'select {{ ds_nodash }} from {{ table }}'
+        self.assertIs(get_template(source), get_template(source))
+        self.assertEqual(render_template(source, ds_nodash='20200101', table='t'), 'select 20200101 from t')
+
+    def test_run_transform_only_used_functions(self):
+        from unittest.mock import patch
+        from fsqlfly import workflow
+        jar = FileResource(name='udf.jar', real_path='/udf.jar')
+        other = FileResource(name='other.jar', real_path='/other.jar')
+        self.session.add_all([jar, other,
+                              Functions(name='parse_json', class_name='a.ParseJson', constructor_config='',
+                                        resource=jar),
+                              Functions(name='to_ts', class_name='a.ToTs', constructor_config='', resource=jar),
+                              Functions(name='unused', class_name='a.Unused', constructor_config='', resource=other),
+                              Transform(name='t', sql="insert into s select PARSE_JSON(msg) from v -- unused(x)",
+                                        yaml="tables:\n- name: v\n  type: view\n  query: select to_ts(x) from k")])
+        self.session.commit()
+        commands = []
+
+        def _check(command, timeout=None):
+            yaml_f = command.split('--environment ')[1].split()[0]
+            commands.append((command, open(yaml_f).read()))
+            return b''
+
+        with patch.object(workflow, '_check_output', _check):
+            is_ok, _ = workflow.run_transform(self.session.query(Transform).one())
+        self.assertTrue(is_ok)
+        command, yaml_conf = commands[0]
+        self.assertEqual(command.count(' -j '), 1)
+        self.assertIn('udf.jar', command)
+        self.assertNotIn('other.jar', command)
+        self.assertIn('a.ParseJson', yaml_conf)
+        self.assertIn('a.ToTs', yaml_conf)
+        self.assertNotIn('a.Unused', yaml_conf)
+
 
 if __name__ == '__main__':
     unittest.main()
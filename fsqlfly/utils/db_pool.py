@@ -0,0 +1,90 @@
+# -*- coding:utf-8 -*-
+import time
+import threading
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.timeouts = 0
+        self.invalidations = 0
+        self.connects = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def add_wait(self, wait: float, timeout: bool = False):
+        with self.lock:
+            if timeout:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def add(self, name: str):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self) -> dict:
+        with self.lock:
+            waits = self.checkouts + self.timeouts
+            return dict(checkouts=self.checkouts, checkins=self.checkins, timeouts=self.timeouts,
+                        invalidations=self.invalidations, connects=self.connects,
+                        wait_total=round(self.wait_total, 6), wait_max=round(self.wait_max, 6),
+                        wait_avg=round(self.wait_total / waits, 6) if waits else 0.0)
+
+
+class TimedQueuePool(QueuePool):
+    def __init__(self, *args, **kwargs):
+        super(TimedQueuePool, self).__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def recreate(self):
+        pool = super(TimedQueuePool, self).recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def _do_get(self):
+        start = time.monotonic()
+        try:
+            conn = super(TimedQueuePool, self)._do_get()
+        except PoolTimeoutError:
+            self.metrics.add_wait(time.monotonic() - start, timeout=True)
+            raise
+        self.metrics.add_wait(time.monotonic() - start)
+        return conn
+
+
+def get_pool_kwargs(url: str, size: int, max_overflow: int, recycle: int, timeout: int, pre_ping: bool) -> dict:
+    kwargs = dict(pool_pre_ping=pre_ping, pool_recycle=recycle)
+    if make_url(url).get_backend_name() != 'sqlite':
+        kwargs.update(poolclass=TimedQueuePool, pool_size=size, max_overflow=max_overflow, pool_timeout=timeout)
+    return kwargs
+
+
+def listen_pool(engine: Engine):
+    metrics = getattr(engine.pool, 'metrics', None)
+    if metrics is None:
+        return
+    event.listen(engine, 'connect', lambda *args: metrics.add('connects'))
+    event.listen(engine, 'checkin', lambda *args: metrics.add('checkins'))
+    event.listen(engine, 'invalidate', lambda *args: metrics.add('invalidations'))
+
+
+def get_pool_status(engine: Engine) -> dict:
+    pool = engine.pool
+    res = dict(pool=type(pool).__name__, status=pool.status())
+    if isinstance(pool, QueuePool):
+        res.update(size=pool.size(), checked_in=pool.checkedin(), checked_out=pool.checkedout(),
+                   overflow=pool.overflow(), timeout=pool.timeout())
+    metrics = getattr(pool, 'metrics', None)
+    if metrics is not None:
+        res.update(metrics.as_dict())
+    return res
@@ -0,0 +1,184 @@
+# -*- coding:utf-8 -*-
+import os
+import re
+import hashlib
+from typing import Optional, Tuple, Iterator, Callable, Iterable, List, Dict
+
+CHUNK_SIZE = 64 * 1024
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+HASH_PREFIX_PATTERN = re.compile(r'^([0-9a-f]{64})_')
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    if not header:
+        return None
+    match = RANGE_PATTERN.match(header.strip())
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        start, end = max(size - int(end), 0), size
+    else:
+        start, end = int(start), min(int(end) + 1, size) if end else size
+    if start >= size or start >= end:
+        raise ValueError('Range Not Satisfiable')
+    return start, end
+
+
+def tail_offset(path: str, lines: int, chunk_size: int = CHUNK_SIZE) -> int:
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = pos = f.tell()
+        if lines <= 0:
+            return end
+        found = 0
+        while pos > 0:
+            step = min(chunk_size, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step)
+            if pos + step == end and data.endswith(b'\n'):
+                data = data[:-1]
+            index = len(data)
+            while True:
+                index = data.rfind(b'\n', 0, index)
+                if index < 0:
+                    break
+                found += 1
+                if found == lines:
+                    return pos + index + 1
+        return 0
+
+
+def iter_file(path: str, start: int = 0, end: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    with open(path, 'rb') as f:
+        f.seek(start)
+        left = None if end is None else end - start
+        while left is None or left > 0:
+            data = f.read(chunk_size if left is None else min(chunk_size, left))
+            if not data:
+                break
+            if left is not None:
+                left -= len(data)
+            yield data
+
+
+def parse_part_headers(data: bytes) -> dict:
+    headers = dict()
+    for line in data.decode('utf-8', errors='replace').split('\r\n'):
+        if ':' in line:
+            k, v = line.split(':', 1)
+            headers[k.strip().lower()] = v.strip()
+    disposition = dict()
+    for item in headers.get('content-disposition', '').split(';')[1:]:
+        if '=' in item:
+            k, v = item.split('=', 1)
+            disposition[k.strip().lower()] = v.strip().strip('"')
+    headers['name'] = disposition.get('name')
+    headers['filename'] = disposition.get('filename')
+    return headers
+
+
+class MultipartStreamParser:
+    PREAMBLE, HEADERS, BODY, DONE = range(4)
+
+    def __init__(self, boundary: bytes, on_part_begin: Callable[[dict], None], on_data: Callable[[bytes], None],
+                 on_part_end: Callable[[], None]):
+        self.delimiter = b'\r\n--' + boundary
+        self.buffer = b'\r\n'
+        self.state = self.PREAMBLE
+        self.on_part_begin = on_part_begin
+        self.on_data = on_data
+        self.on_part_end = on_part_end
+
+    @classmethod
+    def get_boundary(cls, content_type: str) -> Optional[bytes]:
+        if not content_type.startswith('multipart/form-data'):
+            return None
+        for item in content_type.split(';')[1:]:
+            k, _, v = item.strip().partition('=')
+            if k == 'boundary' and v:
+                return v.strip('"').encode('latin1')
+        return None
+
+    def feed(self, chunk: bytes):
+        self.buffer += chunk
+        while True:
+            if self.state == self.PREAMBLE or self.state == self.BODY:
+                index = self.buffer.find(self.delimiter)
+                if index < 0:
+                    keep = len(self.delimiter) - 1
+                    if len(self.buffer) > keep:
+                        if self.state == self.BODY:
+                            self.on_data(self.buffer[:-keep])
+                        self.buffer = self.buffer[-keep:]
+                    return
+                after = index + len(self.delimiter)
+                if len(self.buffer) < after + 2:
+                    return
+                if self.state == self.BODY:
+                    self.on_data(self.buffer[:index])
+                    self.on_part_end()
+                if self.buffer[after:after + 2] == b'--':
+                    self.state = self.DONE
+                    self.buffer = b''
+                    return
+                self.buffer = self.buffer[after + 2:]
+                self.state = self.HEADERS
+            elif self.state == self.HEADERS:
+                index = self.buffer.find(b'\r\n\r\n')
+                if index < 0:
+                    return
+                self.on_part_begin(parse_part_headers(self.buffer[:index]))
+                self.buffer = self.buffer[index + 4:]
+                self.state = self.BODY
+            else:
+                self.buffer = b''
+                return
+
+    @property
+    def finished(self) -> bool:
+        return self.state == self.DONE
+
+
+class JarStore:
+    def __init__(self):
+        self.hashes = dict()  # type: Dict[str, Tuple[Tuple[int, float], str]]
+
+    def get_hash(self, path: str) -> str:
+        match = HASH_PREFIX_PATTERN.match(os.path.basename(path))
+        if match is not None:
+            return match.group(1)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return path
+        version = (stat.st_size, stat.st_mtime)
+        cached = self.hashes.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        digest = hashlib.sha256()
+        for chunk in iter_file(path):
+            digest.update(chunk)
+        self.hashes[path] = (version, digest.hexdigest())
+        return self.hashes[path][1]
+
+    def get_jars(self, paths: Iterable[str]) -> List[str]:
+        seen, out = set(), []
+        for path in paths:
+            key = self.get_hash(path)
+            if key not in seen:
+                seen.add(key)
+                out.append(path)
+        return out
+
+    def get_args(self, paths: Iterable[str]) -> List[str]:
+        out = []
+        for path in self.get_jars(paths):
+            out.extend(['-j', path])
+        return out
+
+
+JAR_STORE = JarStore()
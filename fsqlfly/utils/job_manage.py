@@ -1,8 +1,7 @@
 # -*- coding:utf-8 -*-
-import time
 import re
 import math
-from typing import List, Any, Set
+from typing import List, Set, Dict, Optional
 from collections import namedtuple, Counter
 from datetime import datetime
 from requests import Session
@@ -15,37 +14,11 @@ from fsqlfly.db_helper import DBDao, Transform, DBSession
 
 JobStatus = namedtuple('JobStatus', ['name', 'job_id', 'status', 'full_name',
                                      'start_time', 'end_time', 'duration', 'pt'])
+JobStateEvent = namedtuple('JobStateEvent', ['name', 'job_id', 'old_status', 'new_status'])
 FAIL_HEADER = 'FAIL:'
 SUCCESS_HEADER = 'SUCCESS:'
 
 
-class Cache:
-    def __init__(self, max_store_seconds=5):
-        self.time = dict()
-        self.store = dict()
-        self._max = max_store_seconds
-
-    def get(self, name: str) -> Any:
-        if name not in self.store:
-            return None
-        assert name in self.time
-        if (time.time() - self.time[name]) > self._max:
-            del self.time[name]
-            del self.store[name]
-            return None
-        return self.store[name]
-
-    def set(self, name: str, value: Any):
-        self.store[name] = value
-        self.time[name] = time.time()
-
-    def remove(self, name: str):
-        if name in self.time:
-            del self.time[name]
-        if name in self.store[name]:
-            del self.store[name]
-
-
 class JobControl:
     restart = 'restart'
     stop = 'stop'
@@ -64,7 +37,6 @@ class JobControl:
     def __init__(self, flink_host=None):
         self.host = flink_host
         self.session = Session()
-        self.cache = Cache()
 
     @classmethod
     def p_duration(cls, t: int) -> str:
@@ -87,34 +59,21 @@ class JobControl:
     def p_time(cls, t: int) -> str:
         return str(datetime.fromtimestamp(t / 1000))[:19] if t > 0 else '-'
 
-    def _get_job_status(self, job_id: str) -> JobStatus:
-
-        status = self.session.get(self.host + '/jobs/' + job_id).json()
-        name = status['name'].split(':', maxsplit=1)[0]
+    @classmethod
+    def parse_overview(cls, job: dict) -> JobStatus:
+        name = job['name'].split(':', maxsplit=1)[0]
         if '.' in name:
             name, pt = name.split('.', maxsplit=1)
         else:
             pt = None
-        job_status = JobStatus(name, job_id, status['state'], full_name=status['name'],
-                               start_time=self.p_time(status["start-time"]), end_time=self.p_time(status["end-time"]),
-                               duration=self.p_duration(status['duration']), pt=pt)
-        return job_status
+        return JobStatus(name, job['jid'], job['state'], full_name=job['name'],
+                         start_time=cls.p_time(job['start-time']), end_time=cls.p_time(job['end-time']),
+                         duration=cls.p_duration(job['duration']), pt=pt)
 
     @property
     def job_status(self) -> List[JobStatus]:
-        jobs_url = self.host + '/jobs'
-        js = self.session.get(jobs_url).json()
-        all_jobs = list()
-        for x in js['jobs']:
-            j_id = x['id']
-            if self.cache.get(j_id) is None:
-                status = self._get_job_status(j_id)
-                self.cache.set(j_id, status)
-            else:
-                status = self.cache.get(j_id)
-
-            all_jobs.append(status)
-        return all_jobs
+        overview = self.session.get(self.host + '/jobs/overview').json()
+        return [self.parse_overview(x) for x in overview['jobs']]
 
     @property
     def live_job_names(self) -> Set[str]:
@@ -155,8 +114,10 @@ class JobControl:
         return 'kill {} '.format(jid)
 
     def handle_status(self, transform: Transform, **kwargs) -> str:
+        return self.get_status(transform, self.job_status, **kwargs)
+
+    def get_status(self, transform: Transform, job_status: List[JobStatus], **kwargs) -> str:
         header = get_job_short_name(transform)
-        job_status = self.job_status
         pt = kwargs['pt'] if 'pt' in kwargs else None
         last_run_job_id = kwargs['last_run_job_id'].split('_') if 'last_run_job_id' in kwargs else []
         start = datetime.fromtimestamp(kwargs['start_run_time']) if 'start_run_time' in kwargs else datetime.now()
@@ -207,7 +168,6 @@ class JobControl:
             logger.debug('begin stop flink job {}'.format(j_id))
             logger.debug(self.host)
             res = self.session.patch(self.host + '/jobs/' + j_id + '?mode=cancel')
-            self.cache.remove(j_id)
             print(res.text)
 
     @classmethod
@@ -222,6 +182,54 @@ class JobControl:
         return cls.job_pattern.search(name) is not None
 
 
+class JobWatcher:
+    def __init__(self, flink_host=None):
+        self.host = flink_host
+        self.session = Session()
+        self.jobs = dict()  # type: Dict[str, JobStatus]
+        self.synced = False
+
+    @classmethod
+    def pick(cls, old: Optional[JobStatus], new: JobStatus) -> JobStatus:
+        if old is None:
+            return new
+        if (old.status == JobControl.RUN_STATUS) != (new.status == JobControl.RUN_STATUS):
+            return old if old.status == JobControl.RUN_STATUS else new
+        return new if new.start_time > old.start_time else old
+
+    def diff(self, jobs: Dict[str, JobStatus]) -> List[JobStateEvent]:
+        events = []
+        for name, old in self.jobs.items():
+            new = jobs.get(name)
+            if new is None:
+                events.append(JobStateEvent(name, old.job_id, old.status, None))
+            elif new.status != old.status or new.job_id != old.job_id:
+                events.append(JobStateEvent(name, new.job_id, old.status, new.status))
+        for name, new in jobs.items():
+            if name not in self.jobs:
+                events.append(JobStateEvent(name, new.job_id, None, new.status))
+        return events
+
+    def refresh(self) -> List[JobStateEvent]:
+        overview = self.session.get(self.host + '/jobs/overview').json()
+        jobs = dict()
+        for x in overview['jobs']:
+            status = JobControl.parse_overview(x)
+            jobs[status.name] = self.pick(jobs.get(status.name), status)
+        events = self.diff(jobs)
+        self.jobs = jobs
+        self.synced = True
+        return events
+
+    @classmethod
+    def lost_job_names(cls, events: List[JobStateEvent]) -> Set[str]:
+        return {x.name for x in events if x.new_status != JobControl.RUN_STATUS}
+
+    @property
+    def live_job_names(self) -> Set[str]:
+        return {k for k, v in self.jobs.items() if v.status == JobControl.RUN_STATUS}
+
+
 JobControlHandle = JobControl(FSQLFLY_FINK_HOST)
 
 
@@ -244,8 +252,28 @@ def _handle_job(mode: str, pk: str, json_body: dict, session: Session) -> DBRes:
 
 
 def handle_job(mode: str, pk: str, json_body: dict) -> DBRes:
-    session = DBSession.get_session()
-    try:
+    with DBSession.scope() as session:
         return _handle_job(mode, pk, json_body, session)
-    finally:
-        session.close()
+
+
+def _handle_bulk_status(jobs: List[dict], session: Session) -> DBRes:
+    transforms = DBDao.get_transforms_by_names([str(x['name']) for x in jobs], session=session)
+    job_status = JobControlHandle.job_status
+    data = []
+    for job in jobs:
+        name = str(job['name'])
+        kwargs = {k: v for k, v in job.items() if k != 'name'}
+        if name not in transforms:
+            data.append(dict(name=name, success=False, code=500, msg='job {} not found!!!'.format(name)))
+            continue
+        msg = JobControlHandle.get_status(transforms[name], job_status, **kwargs)
+        data.append(dict(name=name, success=True, code=200, msg=msg))
+    return DBRes(data=data)
+
+
+def handle_bulk_status(json_body: dict) -> DBRes:
+    jobs = json_body.get('jobs') if isinstance(json_body, dict) else None
+    if not isinstance(jobs, list):
+        return DBRes.api_error(msg='jobs list required!!!')
+    with DBSession.scope() as session:
+        return _handle_bulk_status(jobs, session)
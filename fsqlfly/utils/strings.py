@@ -2,9 +2,14 @@
 import re
 import yaml
 from typing import Optional
+from functools import lru_cache
 from collections import namedtuple
-from io import StringIO
-from typing import Callable, List, Tuple, Union, Any
+from typing import Callable, List, Tuple, Union, Any, Iterable, Set
+
+try:
+    from yaml import CSafeLoader as YamlLoader, CDumper as YamlDumper
+except ImportError:
+    from yaml import SafeLoader as YamlLoader, Dumper as YamlDumper
 
 __CAMEL_PATTERN = re.compile("(?<=[a-z0-9])(_[a-z])")
 
@@ -47,13 +52,31 @@ def _convert_yaml(source: Any, con: Callable) -> Any:
         return source
 
 
+def _to_underline(x: str) -> str:
+    return x.replace('-', '_')
+
+
+def _to_hyphen(x: str) -> str:
+    return x.replace('_', '-')
+
+
+def _same(x: str) -> str:
+    return x
+
+
 def load_yaml(source: str, to_underline: bool = True) -> dict:
-    d = yaml.load(StringIO(source), Loader=yaml.SafeLoader)
-    return _convert_yaml(d, lambda x: x.replace('-', '_') if to_underline else lambda x: x)
+    d = yaml.load(source, Loader=YamlLoader)
+    return _convert_yaml(d, _to_underline if to_underline else _same)
+
+
+# shared result, only for immutable text like SchemaEvent.fields, never modify the return value
+@lru_cache(maxsize=4096)
+def load_yaml_cached(source: str) -> Any:
+    return load_yaml(source)
 
 
 def dump_yaml(source: Union[list, dict], not_underline: bool = True) -> str:
-    return yaml.dump(_convert_yaml(source, lambda x: x.replace('_', '-') if not_underline else lambda x: x))
+    return yaml.dump(_convert_yaml(source, _to_hyphen if not_underline else _same), Dumper=YamlDumper)
 
 
 def check_yaml(source: str) -> bool:
@@ -100,7 +123,7 @@ def generate_yaml(source: List[Tuple[str, str]], is_sink: bool = False) -> str:
         },
         'schema': schemas
     }
-    out = yaml.dump(data)
+    out = yaml.dump(data, Dumper=YamlDumper)
     return out
 
 
@@ -131,6 +154,15 @@ def clean_sql(sql: str) -> str:
     return SQL_COMMENT_PATTERN_CLEAN.sub('', sql).strip()
 
 
+SQL_IGNORE_PATTERN = re.compile(r"--[^\n]*|/\*.*?\*/|'(?:[^']|'')*'", re.DOTALL)
+SQL_FUNCTION_CALL_PATTERN = re.compile(r'`?([A-Za-z_][A-Za-z0-9_]*)`?\s*\(')
+
+
+def get_used_functions(sql: str, names: Iterable[str]) -> Set[str]:
+    called = set(x.lower() for x in SQL_FUNCTION_CALL_PATTERN.findall(SQL_IGNORE_PATTERN.sub(' ', sql or '')))
+    return set(x for x in names if x.lower() in called)
+
+
 def get_job_header(transform, **kwargs) -> str:
     return "{}_{}{}".format(transform.id, transform.name, '.' + kwargs['pt'] if 'pt' in kwargs else '')
 
@@ -1,7 +1,20 @@
 from typing import Optional, Union
+from functools import lru_cache
 from datetime import timedelta, datetime
+from jinja2 import Environment, Template
 from fsqlfly.utils import macros
 
+TEMPLATE_ENV = Environment()
+
+
+@lru_cache(maxsize=1024)
+def get_template(source: str) -> Template:
+    return TEMPLATE_ENV.from_string(source)
+
+
+def render_template(source: str, **kwargs) -> str:
+    return get_template(source).render(**kwargs)
+
 
 def generate_template_context(execution_date: Optional[Union[datetime, str]] = None, **kwargs):
     execution_date = execution_date if execution_date else datetime.now()
@@ -0,0 +1,220 @@
+# -*- coding:utf-8 -*-
+import os
+import time
+import hashlib
+import tempfile
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Dict
+from tornado import ioloop
+from terminado.management import NamedTermManager, PtyWithClients
+from logzero import logger
+from fsqlfly import settings
+
+
+def get_environment_key(yaml_conf: str, jars: List[str]) -> str:
+    return hashlib.sha1('\0'.join([yaml_conf] + jars).encode()).hexdigest()
+
+
+def start_terminal(manager: NamedTermManager, yaml_conf: str, jars: List[str]) -> str:
+    _, yaml_f = tempfile.mkstemp(suffix='.yaml')
+    print(yaml_conf, file=open(yaml_f, 'w'))
+    name = manager._next_available_name()
+    run_commands = [settings.FSQLFLY_FLINK_BIN, 'embedded',
+                    '-s', '{}{}'.format(settings.TEMP_TERMINAL_HEAD, str(name)),
+                    '--environment', yaml_f,
+                    *jars]
+    logger.debug('running commands is : {}'.format(' '.join(run_commands)))
+    term = manager.new_terminal(shell_command=run_commands)
+    term.term_name = name
+    term.run_command = ' '.join(run_commands)
+    touch_terminal(term)
+    manager.terminals[name] = term
+    return name
+
+
+def touch_terminal(term: PtyWithClients):
+    now = time.time()
+    if getattr(term, 'created_at', None) is None:
+        term.created_at = now
+    term.last_active = now
+
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def read_process_table() -> Dict[int, Tuple[int, int]]:
+    table = dict()
+    if not os.path.isdir('/proc'):
+        return table
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open('/proc/{}/stat'.format(pid)) as f:
+                stat = f.read()
+        except OSError:
+            continue
+        fields = stat[stat.rindex(')') + 2:].split()
+        table[int(pid)] = (int(fields[1]), int(fields[21]) * PAGE_SIZE)
+    return table
+
+
+def get_tree_rss(pids: List[int]) -> Dict[int, int]:
+    table = read_process_table()
+    children = dict()
+    for pid, (ppid, _) in table.items():
+        children.setdefault(ppid, []).append(pid)
+    res = dict()
+    for pid in pids:
+        total, stack = 0, [pid]
+        while stack:
+            x = stack.pop()
+            if x in table:
+                total += table[x][1]
+            stack.extend(children.get(x, []))
+        res[pid] = total
+    return res
+
+
+def close_terminal(manager: NamedTermManager, name: str):
+    term = manager.terminals.get(name)
+    if term is None:
+        return
+    if term.ptyproc.fd in manager.ptys_by_fd:
+        manager.kill(name)
+    else:
+        manager.terminals.pop(name, None)
+        term.ptyproc.terminate(force=True)
+
+
+class TerminalPool:
+    def __init__(self, manager: NamedTermManager, size: int, max_environments: int = 4):
+        self.manager = manager
+        self.size = size
+        self.max_environments = max_environments
+        self.environments = OrderedDict()  # type: OrderedDict[str, Tuple[str, List[str]]]
+        self.idle = dict()  # type: dict[str, List[str]]
+        self.refilling = False
+        self.paused = False
+
+    @property
+    def enable(self) -> bool:
+        return self.size > 0
+
+    def has_free_slot(self) -> bool:
+        return not self.manager.max_terminals or len(self.manager.terminals) < self.manager.max_terminals
+
+    def watch(self, yaml_conf: str, jars: List[str]) -> str:
+        key = get_environment_key(yaml_conf, jars)
+        self.environments[key] = (yaml_conf, jars)
+        self.environments.move_to_end(key)
+        self.idle.setdefault(key, [])
+        while len(self.environments) > self.max_environments:
+            old, _ = self.environments.popitem(last=False)
+            for name in self.idle.pop(old, []):
+                close_terminal(self.manager, name)
+        return key
+
+    def acquire(self, yaml_conf: str, jars: List[str]) -> Optional[str]:
+        if not self.enable:
+            return None
+        key = self.watch(yaml_conf, jars)
+        idle = self.idle[key]
+        name = None
+        while idle and name is None:
+            candidate = idle.pop(0)
+            term = self.manager.terminals.get(candidate)
+            if term is not None and term.ptyproc.isalive():
+                name = candidate
+        self.schedule_refill()
+        return name
+
+    def refill(self):
+        self.refilling = False
+        if self.paused:
+            return
+        for key, (yaml_conf, jars) in list(self.environments.items())[::-1]:
+            idle = self.idle[key]
+            idle[:] = [x for x in idle if x in self.manager.terminals]
+            while len(idle) < self.size and self.has_free_slot():
+                idle.append(start_terminal(self.manager, yaml_conf, jars))
+                logger.debug('add warm terminal {} to pool'.format(idle[-1]))
+
+    def schedule_refill(self):
+        if self.enable and not self.paused and not self.refilling:
+            self.refilling = True
+            ioloop.IOLoop.current().add_callback(self.refill)
+
+    def is_idle(self, name: str) -> bool:
+        return any(name in x for x in self.idle.values())
+
+
+class TerminalReaper:
+    def __init__(self, manager: NamedTermManager, pool: Optional[TerminalPool] = None, idle_timeout: int = 0,
+                 max_age: int = 0, memory_budget: int = 0):
+        self.manager = manager
+        self.pool = pool
+        self.idle_timeout = idle_timeout
+        self.max_age = max_age
+        self.memory_budget = memory_budget
+        self.pooled_rss = 0
+
+    def is_idle(self, name: str) -> bool:
+        return self.pool is not None and self.pool.is_idle(name)
+
+    def get_usage(self) -> List[dict]:
+        terms = list(self.manager.terminals.items())
+        for _, term in terms:
+            if getattr(term, 'created_at', None) is None:
+                touch_terminal(term)
+        rss = get_tree_rss([term.ptyproc.pid for _, term in terms])
+        return [dict(name=name, pid=term.ptyproc.pid, rss=rss.get(term.ptyproc.pid, 0), created_at=term.created_at,
+                     last_active=term.last_active, clients=len(term.clients), pooled=self.is_idle(name))
+                for name, term in terms]
+
+    def get_expired(self, usage: List[dict], now: float) -> List[str]:
+        expired = []
+        for x in usage:
+            if self.max_age and now - x['created_at'] > self.max_age:
+                expired.append(x['name'])
+            elif self.idle_timeout and not x['pooled'] and now - x['last_active'] > self.idle_timeout:
+                expired.append(x['name'])
+        return expired
+
+    def get_over_budget(self, usage: List[dict]) -> List[str]:
+        total = sum(x['rss'] for x in usage)
+        evicted = []
+        for x in sorted(usage, key=lambda u: (not u['pooled'], u['last_active'])):
+            if not self.memory_budget or total <= self.memory_budget:
+                break
+            evicted.append(x['name'])
+            total -= x['rss']
+        return evicted
+
+    def has_room(self, usage: List[dict]) -> bool:
+        return not self.memory_budget or sum(x['rss'] for x in usage) + self.pooled_rss <= self.memory_budget
+
+    def reap(self) -> List[str]:
+        usage = self.get_usage()
+        self.pooled_rss = max([self.pooled_rss] + [x['rss'] for x in usage if x['pooled']])
+        expired = self.get_expired(usage, time.time())
+        evicted = expired + self.get_over_budget([x for x in usage if x['name'] not in expired])
+        for name in evicted:
+            logger.info('reap terminal {}'.format(name))
+            close_terminal(self.manager, name)
+        if self.pool is not None:
+            paused = self.pool.paused
+            self.pool.paused = not self.has_room([x for x in usage if x['name'] not in evicted])
+            if evicted or paused and not self.pool.paused:
+                self.pool.schedule_refill()
+        return evicted
+
+    def start(self, interval: int):
+        ioloop.PeriodicCallback(self.reap, interval * 1000).start()
+
+
+TERMINAL_POOL = TerminalPool(settings.TERMINAL_MANAGER, settings.FSQLFLY_TERMINAL_POOL_SIZE)
+TERMINAL_REAPER = TerminalReaper(settings.TERMINAL_MANAGER, TERMINAL_POOL,
+                                 idle_timeout=settings.FSQLFLY_TERMINAL_IDLE_TIMEOUT,
+                                 max_age=settings.FSQLFLY_TERMINAL_MAX_AGE,
+                                 memory_budget=settings.FSQLFLY_TERMINAL_MEMORY_BUDGET * 1024 * 1024)
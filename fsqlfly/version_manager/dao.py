@@ -1,6 +1,7 @@
-from typing import Optional, Callable, Any, Union
-from fsqlfly.db_helper import (Session, DBSession, SchemaEvent, and_, ResourceName, ResourceTemplate, ResourceVersion,
-                               Transform, SUPPORT_MODELS, DBT, Connection, Connector)
+from typing import Optional, Callable, Any, Union, List, Dict, Type
+from fsqlfly.db_helper import (Session, DBSession, SchemaEvent, and_, or_, ResourceName, ResourceTemplate,
+                               ResourceVersion, Transform, TransformSavepoint, TransformDaemonState, SUPPORT_MODELS, DBT,
+                               Connection, Connector)
 from fsqlfly.common import DBRes
 
 
@@ -38,7 +39,7 @@ def auto_commit(func: Callable):
 class Dao(BaseDao):
     @classmethod
     def schema_is_equal(cls, a: SchemaEvent, b: SchemaEvent) -> bool:
-        return a.fields != b.fields or a.primary_key != b.primary_key or b.partitionable != b.partitionable
+        return a.schema_fields != b.schema_fields or a.primary_key != b.primary_key or b.partitionable != b.partitionable
 
     def upsert_schema_event(self, obj: SchemaEvent) -> (SchemaEvent, bool):
         session = self.session
@@ -146,6 +147,9 @@ class Dao(BaseDao):
         session.commit()
         return res, inserted
 
+    def get_transforms_by_names(self, names: List[str]) -> Dict[str, Transform]:
+        return {x.name: x for x in self.session.query(Transform).filter(Transform.name.in_(names)).all()}
+
     def name2pk(self, model: str, name: str) -> int:
         base = SUPPORT_MODELS[model]
         return self.session.query(base.id).filter(base.name == name).one()[0]
@@ -164,23 +168,53 @@ class Dao(BaseDao):
         self.session.add(obj)
         return obj
 
+    def bulk_delete(self, base: Type[DBT], *criterion) -> int:
+        return self.session.query(base).filter(*criterion).delete(synchronize_session=False)
+
     @auto_commit
     def clean_connection(self, obj: Connection) -> DBRes:
-        num = 0
-        for x in self.session.query(ResourceName).join(ResourceName.connection).filter(Connection.id == obj.id).all():
-            self.session.delete(x)
-            num += 1
-        msg = 'clean {} resource name'.format(num)
-        return DBRes(msg=msg)
+        names = self.session.query(ResourceName.id).filter(ResourceName.connection_id == obj.id).subquery()
+        templates = self.session.query(ResourceTemplate.id).filter(ResourceTemplate.resource_name_id.in_(names))
+        counts = dict()
+        counts['resource_version'] = self.bulk_delete(ResourceVersion,
+                                                      or_(ResourceVersion.resource_name_id.in_(names),
+                                                          ResourceVersion.template_id.in_(templates.subquery())))
+        counts['resource_template'] = self.bulk_delete(ResourceTemplate, ResourceTemplate.resource_name_id.in_(names))
+        counts['resource_name'] = self.bulk_delete(ResourceName, ResourceName.connection_id == obj.id)
+        self.session.expire_all()
+        msg = 'clean {resource_name} resource name, {resource_template} template, {resource_version} version'
+        return DBRes(data=counts, msg=msg.format(**counts))
 
     @auto_commit
     def clean_connector(self, obj: Connector) -> DBRes:
-        num = 0
-        for x in self.session.query(Transform).join(Transform.connector).filter(Connector.id == obj.id).all():
-            self.session.delete(x)
-            num += 1
-        msg = 'clean {} transform'.format(num)
-        return DBRes(msg=msg)
+        transforms = self.session.query(Transform.id).filter(Transform.connector_id == obj.id).subquery()
+        counts = dict()
+        counts['transform_savepoint'] = self.bulk_delete(TransformSavepoint,
+                                                         TransformSavepoint.transform_id.in_(transforms))
+        counts['transform_daemon_state'] = self.bulk_delete(TransformDaemonState,
+                                                            TransformDaemonState.transform_id.in_(transforms))
+        counts['transform'] = self.bulk_delete(Transform, Transform.connector_id == obj.id)
+        self.session.expire_all()
+        msg = 'clean {transform} transform'.format(**counts)
+        return DBRes(data=counts, msg=msg)
+
+    def get_transform_names(self, obj: Connector) -> List[str]:
+        return [x for x, in self.session.query(Transform.name).filter(Transform.connector_id == obj.id).all()]
+
+    @auto_commit
+    def delete_transforms(self, obj: Connector, names: List[str]) -> int:
+        if not names:
+            return 0
+        kept = self.session.query(TransformSavepoint.transform_id).filter(TransformSavepoint.transform_id.isnot(None))
+        query = self.session.query(Transform.id).filter(Transform.connector_id == obj.id, Transform.name.in_(names),
+                                                        Transform.id.notin_(kept))
+        ids = [x for x, in query.all()]
+        if not ids:
+            return 0
+        self.bulk_delete(TransformDaemonState, TransformDaemonState.transform_id.in_(ids))
+        count = self.bulk_delete(Transform, Transform.id.in_(ids))
+        self.session.expire_all()
+        return count
 
     def get_default_version(self, database: str, table: str, connection_id: int,
                             template_name: str) -> Optional[ResourceVersion]:
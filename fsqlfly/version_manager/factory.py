@@ -6,7 +6,7 @@ from fsqlfly.version_manager.dao import Dao
 from fsqlfly.version_manager.manager.update import (ResourceVersionUpdateManager, ResourceNameUpdateManager,
                                                     ResourceTemplateUpdateManager, ConnectionUpdateManager)
 from fsqlfly.version_manager.manager.init import (ConnectorInitTransformManager, HiveInitTransformManager,
-                                                  ListInitJobManager)
+                                                  ListInitJobManager, StartConnectorJobManager)
 from fsqlfly.version_manager.clean_manager import (ConnectionCleanManager, ConnectorCleanManager)
 from fsqlfly.version_manager.generator import (BaseResourceGenerator, SinkResourceGenerator,
                                                CanalResourceGenerator, SystemConnectorGenerator)
@@ -18,13 +18,13 @@ class BaseManagerFactory:
         raise NotImplementedError
 
     @classmethod
-    def get_manager(cls, model: str, obj: DBT, dao: Dao) -> BaseVersionManager:
+    def get_manager(cls, model: str, obj: DBT, dao: Dao, **kwargs) -> BaseVersionManager:
         if cls.is_support(model, obj):
-            return cls.build(obj, dao)
+            return cls.build(obj, dao, **kwargs)
         return BaseVersionManager.not_support_manager()
 
     @classmethod
-    def build(cls, obj: DBT, dao: Dao) -> BaseVersionManager:
+    def build(cls, obj: DBT, dao: Dao, **kwargs) -> BaseVersionManager:
         raise NotImplementedError
 
 
@@ -65,7 +65,7 @@ class UpdateManagerFactory(BaseManagerFactory):
         return generator
 
     @classmethod
-    def build(cls, obj: DBT, dao: Dao) -> BaseVersionManager:
+    def build(cls, obj: DBT, dao: Dao, **kwargs) -> BaseVersionManager:
         generator = cls.get_generator(obj)
         if isinstance(obj, ResourceVersion):
             return ResourceVersionUpdateManager(obj, dao, generator)
@@ -91,7 +91,7 @@ class CleanManagerFactory(BaseManagerFactory):
         return model in (PageModel.connector, PageModel.connection)
 
     @classmethod
-    def build(cls, obj: DBT, dao: Dao) -> BaseVersionManager:
+    def build(cls, obj: DBT, dao: Dao, **kwargs) -> BaseVersionManager:
         if isinstance(obj, Connection):
             return ConnectionCleanManager(obj, dao)
         elif isinstance(obj, Connector):
@@ -106,7 +106,7 @@ class InitManagerFactory(BaseManagerFactory):
         return model == PageModel.connector
 
     @classmethod
-    def build(cls, obj: Connector, dao: Dao) -> BaseVersionManager:
+    def build(cls, obj: Connector, dao: Dao, **kwargs) -> BaseVersionManager:
         assert isinstance(obj, Connector)
         if obj.target.type.code == FlinkConnectorType.hive:
             return HiveInitTransformManager(obj, dao)
@@ -119,10 +119,20 @@ class ListManagerFactory(BaseManagerFactory):
         return model == PageModel.connector
 
     @classmethod
-    def build(cls, obj: DBT, dao: Dao) -> BaseVersionManager:
+    def build(cls, obj: DBT, dao: Dao, **kwargs) -> BaseVersionManager:
         return ListInitJobManager(obj, dao)
 
 
+class StartManagerFactory(BaseManagerFactory):
+    @classmethod
+    def is_support(cls, model: str, obj: DBT) -> bool:
+        return model == PageModel.connector
+
+    @classmethod
+    def build(cls, obj: DBT, dao: Dao, **kwargs) -> BaseVersionManager:
+        return StartConnectorJobManager(obj, dao, **kwargs)
+
+
 class ManagerFactory:
     @classmethod
     def get_factory(cls, mode: str) -> Type[BaseManagerFactory]:
@@ -134,9 +144,11 @@ class ManagerFactory:
             return InitManagerFactory
         elif mode == PageModelMode.list:
             return ListManagerFactory
+        elif mode == PageModelMode.start:
+            return StartManagerFactory
         raise NotImplementedError("current not support {} - in ManagerFactory ".format(mode))
 
     @classmethod
-    def get_manager(cls, model: str, mode: str, obj: DBT, dao: Dao) -> BaseVersionManager:
+    def get_manager(cls, model: str, mode: str, obj: DBT, dao: Dao, **kwargs) -> BaseVersionManager:
         factory = cls.get_factory(mode)
-        return factory.get_manager(model, obj, dao)
+        return factory.get_manager(model, obj, dao, **kwargs)
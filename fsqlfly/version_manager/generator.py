@@ -3,7 +3,8 @@ from copy import deepcopy
 from typing import List
 from fsqlfly.common import SchemaContent, VersionConfig, SchemaField, CanalMode, BlinkSQLType, FlinkConnectorType
 from fsqlfly.db_helper import Connection, ResourceName, ResourceTemplate, SchemaEvent, ResourceVersion, Connector
-from fsqlfly.utils.strings import dump_yaml, load_yaml, get_full_name
+from fsqlfly.db_models import dump_schema_fields
+from fsqlfly.utils.strings import dump_yaml, get_full_name
 
 
 class IBaseResourceGenerator:
@@ -30,7 +31,7 @@ class BaseResourceGenerator(IBaseResourceGenerator):
     def generate_schema_event(self, schema: SchemaContent, connection: Connection) -> SchemaEvent:
         return SchemaEvent(name=schema.name, info=schema.comment, database=schema.database,
                            connection_id=connection.id, comment=schema.comment, primary_key=schema.primary_key,
-                           fields=dump_yaml([attr.asdict(x) for x in schema.fields]),
+                           fields=dump_schema_fields(schema.fields),
                            partitionable=schema.partitionable)
 
     def generate_resource_name(self, connection: Connection, schema: SchemaEvent) -> ResourceName:
@@ -84,15 +85,12 @@ class CanalResourceGenerator(BaseResourceGenerator):
         cnt = self._connector
         fields = []
         config.exclude = '.*'
-        schema_fields = [SchemaField(**x) for x in load_yaml(schema_event.fields)] if schema_event else []
+        schema_fields = schema_event.schema_fields if schema_event else []
 
         for schema in schema_fields:
             for suffix, tp in zip([cnt.before_column_suffix, cnt.after_column_suffix, cnt.update_suffix],
                                   [schema.type, schema.type, BlinkSQLType.BOOLEAN]):
-                n_schema = deepcopy(schema)
-                n_schema.type = tp
-                n_schema.name = n_schema.name + suffix
-                fields.append(n_schema)
+                fields.append(attr.evolve(schema, type=tp, name=schema.name + suffix))
         return fields
 
     def _generate_upsert_fields(self) -> List[SchemaField]:
@@ -9,11 +9,11 @@ class ManagerHelper:
     all_support_key = PageModel.keys()
 
     @classmethod
-    def run(cls, model: str, mode: str, pk: Union[str, int]) -> DBRes:
+    def run(cls, model: str, mode: str, pk: Union[str, int], **kwargs) -> DBRes:
         dao = Dao()
         obj = dao.get_by_name_or_id(model, pk)
         if obj:
-            manager = ManagerFactory.get_manager(model, mode, obj, dao)
+            manager = ManagerFactory.get_manager(model, mode, obj, dao, **kwargs)
             if manager.is_support():
                 return manager.run()
             else:
@@ -1,11 +1,14 @@
 from abc import ABC
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
 from sqlalchemy import create_engine
-from fsqlfly.db_helper import Connector, ResourceName, ResourceVersion, Transform, Connection
+from fsqlfly.db_helper import DBSession, Connector, ResourceName, ResourceVersion, Transform, Connection
 from fsqlfly.common import DBRes, ConnectorType, BlinkSQLType, BlinkHiveSQLType, FlinkConnectorType
 from fsqlfly.version_manager.base import BaseVersionManager
 from fsqlfly.version_manager.dao import Dao
 from fsqlfly.utils.strings import dump_yaml
+from fsqlfly.settings import FSQLFLY_CONNECTOR_START_PARALLELISM
+from fsqlfly.workflow import run_transform, SharedRequire, get_submitted_job_ids
 
 
 class InitManager(BaseVersionManager, ABC):
@@ -63,31 +66,61 @@ class ConnectorInitTransformManager(InitManager):
             return 'batch'
         return 'streaming'
 
+    def get_transform_groups(self, resource_names: List[ResourceName]) -> List[Tuple[str, List[ResourceName]]]:
+        connector = self.target
+        size = connector.system_bundle_size
+        if size == 1:
+            return [(connector.get_transform_name_format(resource_name=x), [x]) for x in resource_names]
+        ordered = sorted(resource_names, key=lambda x: (x.id, x.full_name))
+        return [(connector.get_bundle_name_format(index=i // size), ordered[i:i + size])
+                for i in range(0, len(ordered), size)]
+
+    def get_stale_bundle_names(self, names: List[str]) -> List[str]:
+        connector = self.target
+        exists = set(self.dao.get_transform_names(connector))
+        candidates = [connector.get_bundle_name_format(index=i) for i in range(len(names), len(names) + len(exists))]
+        return [x for x in candidates if x in exists and x not in names]
+
+    @classmethod
+    def build_statement_set(cls, sqls: List[str]) -> str:
+        if len(sqls) == 1:
+            return sqls[0]
+        return '\n'.join(['BEGIN STATEMENT SET;'] + sqls + ['END;'])
+
     def _generate_transform(self, resource_names: List[ResourceName]) -> DBRes:
         updated = inserted = 0
         connector = self.target
-        for resource_name in resource_names:
-            t_database, t_table = connector.get_transform_target_full_name(resource_name=resource_name,
-                                                                           connector=connector)
-            name = connector.get_transform_name_format(resource_name=resource_name)
-            source_version = self.get_source_default_version(resource_name)
-            if source_version is None:
-                return DBRes.api_error(msg="Not found resource source table {}".format(resource_name.full_name))
-            sink_version = self.get_sink_default_version(t_database, t_table)
-            if sink_version is None:
-                return DBRes.api_error(msg="Not found resource sink table {}".format(resource_name.full_name))
-            require = self.get_source_name(source_version) + ',' + self.get_source_name(sink_version)
+        groups = self.get_transform_groups(resource_names)
+        for name, group in groups:
+            sqls, require = [], []
+            for resource_name in group:
+                t_database, t_table = connector.get_transform_target_full_name(resource_name=resource_name,
+                                                                               connector=connector)
+                source_version = self.get_source_default_version(resource_name)
+                if source_version is None:
+                    return DBRes.api_error(msg="Not found resource source table {}".format(resource_name.full_name))
+                sink_version = self.get_sink_default_version(t_database, t_table)
+                if sink_version is None:
+                    return DBRes.api_error(msg="Not found resource sink table {}".format(resource_name.full_name))
+                sqls.append(self.build_sql(sink_version, source_version, connector))
+                for x in (self.get_source_name(source_version), self.get_source_name(sink_version)):
+                    if x not in require:
+                        require.append(x)
 
             execution = dict(planner='blink', type=self.get_flink_execution_type(),
                              parallelism=connector.system_execution_parallelism)
             execution['restart-strategy'] = connector.system_execution_restart_strategy
-            transform = Transform(name=name, sql=self.build_sql(sink_version, source_version, connector),
-                                  require=require, connector_id=connector.id, yaml=dump_yaml(dict(execution=execution)))
+            transform = Transform(name=name, sql=self.build_statement_set(sqls),
+                                  require=','.join(require), connector_id=connector.id,
+                                  yaml=dump_yaml(dict(execution=execution)))
             transform, i = self.dao.upsert_transform(transform)
             inserted += i
             updated += not i
 
-        msg = 'update: {}\ninserted: {}'.format(updated, inserted)
+        deleted = 0
+        if connector.system_bundle_size > 1 and connector.system_bundle_prune:
+            deleted = self.dao.delete_transforms(connector, self.get_stale_bundle_names([name for name, _ in groups]))
+        msg = 'update: {}\ninserted: {}\ndeleted: {}'.format(updated, inserted, deleted)
         return DBRes(msg=msg)
 
     def _run(self, resource_names: List[ResourceName]):
@@ -155,8 +188,45 @@ class HiveInitTransformManager(ConnectorInitTransformManager):
 
 class ListInitJobManager(ConnectorInitTransformManager):
     def _run(self, resource_names: List[ResourceName]):
-        res = []
-        for resource_name in resource_names:
-            name = self.target.get_transform_name_format(resource_name=resource_name)
-            res.append(name)
-        return DBRes(data=res)
+        return DBRes(data=[name for name, _ in self.get_transform_groups(resource_names)])
+
+
+class StartConnectorJobManager(ListInitJobManager):
+    reserved_args = ('shared', 'timeout')
+
+    def __init__(self, target: Connector, dao: Dao, args: Optional[dict] = None):
+        super(StartConnectorJobManager, self).__init__(target, dao)
+        self.args = dict(args) if isinstance(args, dict) else dict()
+        parallelism = self.args.pop('parallelism', None)
+        self.parallelism = max(int(parallelism), 1) if parallelism else FSQLFLY_CONNECTOR_START_PARALLELISM
+
+    @classmethod
+    def start(cls, transform: Transform, shared: SharedRequire, args: dict) -> dict:
+        is_ok, out = run_transform(transform, shared=shared, **args)
+        return dict(name=transform.name, success=is_ok, job_ids=get_submitted_job_ids(out) if is_ok else [],
+                    msg='' if is_ok else out)
+
+    @classmethod
+    def detach(cls, transform: Transform) -> Transform:
+        return Transform(id=transform.id, name=transform.name, sql=transform.sql, require=transform.require,
+                         yaml=transform.yaml)
+
+    def _run(self, resource_names: List[ResourceName]):
+        reserved = [x for x in self.reserved_args if x in self.args]
+        if reserved:
+            return DBRes.api_error(msg="{} can not be used as template args".format(', '.join(reserved)))
+        names = [name for name, _ in self.get_transform_groups(resource_names)]
+        transforms = {k: self.detach(v) for k, v in self.dao.get_transforms_by_names(names).items()}
+        not_found = [x for x in names if x not in transforms]
+        if not_found:
+            return DBRes.api_error(msg="Not found transform {}, please init connector first".format(
+                ', '.join(not_found)))
+        shared = SharedRequire.load()
+        self.dao.session.commit()
+        DBSession.commit_current()
+        with ThreadPoolExecutor(max_workers=self.parallelism) as pool:
+            futures = [pool.submit(self.start, transforms[x], shared, self.args) for x in names]
+            res = [x.result() for x in futures]
+        failed = sum(not x['success'] for x in res)
+        return DBRes(code=200 if failed == 0 else 500, data=res,
+                     msg='started: {}\nfailed: {}'.format(len(res) - failed, failed))
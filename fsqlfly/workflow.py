@@ -1,20 +1,45 @@
 # -*- coding: utf-8 -*-
 import os
 import re
+import signal
 import subprocess
 import tempfile
 import yaml
-from typing import Optional
-from jinja2 import Template
+import attr
+from typing import Optional, List, Tuple
 from terminado.management import NamedTermManager
 from fsqlfly.settings import FSQLFLY_UPLOAD_DIR, FSQLFLY_FLINK_BIN, logger
-from fsqlfly.db_helper import Transform, DBDao
+from fsqlfly.db_helper import Transform, DBDao, DBSession
 from fsqlfly import settings
-from fsqlfly.utils.strings import get_job_header, dump_yaml
-from fsqlfly.utils.template import generate_template_context
+from fsqlfly.utils.strings import get_job_header, dump_yaml, get_used_functions
+from fsqlfly.utils.files import JAR_STORE
+from fsqlfly.utils.template import generate_template_context, render_template
+from fsqlfly.utils.terminal import TERMINAL_POOL, start_terminal
 
 
-def _create_config(require: str, config: Optional[str], args: dict) -> str:
+@attr.s(slots=True)
+class SharedRequire:
+    functions: List[dict] = attr.ib(factory=list)
+    function_jars: List[Tuple[str, str]] = attr.ib(factory=list)
+
+    @classmethod
+    def load(cls) -> 'SharedRequire':
+        return cls(functions=DBDao.get_require_functions(), function_jars=DBDao.get_function_jars())
+
+    def select(self, sql: str) -> Tuple[List[dict], List[str]]:
+        used = get_used_functions(sql, [x['name'] for x in self.functions])
+        return ([x for x in self.functions if x['name'] in used],
+                JAR_STORE.get_args([path for name, path in self.function_jars if name in used]))
+
+
+JOB_ID_PATTERN = re.compile(r'Job ID: ([0-9a-fA-F]{32})')
+
+
+def get_submitted_job_ids(out: str) -> List[str]:
+    return JOB_ID_PATTERN.findall(out)
+
+
+def _create_base_config(require: str, config: Optional[str], args: dict) -> dict:
     tables = []
     catalogs = []
     require = require.strip() if require and require.strip() else ''
@@ -29,11 +54,24 @@ def _create_config(require: str, config: Optional[str], args: dict) -> str:
         base_config['tables'].extend(tables)
     else:
         base_config['tables'] = tables
-    base_config['functions'] = DBDao.get_require_functions()
     if base_config.get('catalogs'):
         base_config['catalogs'].extend(catalogs)
     else:
         base_config['catalogs'] = catalogs
+    return base_config
+
+
+def _get_config_text(value) -> str:
+    if isinstance(value, dict):
+        return '\n'.join(_get_config_text(x) for x in value.values())
+    if isinstance(value, list):
+        return '\n'.join(_get_config_text(x) for x in value)
+    return value if isinstance(value, str) else ''
+
+
+def _create_config(require: str, config: Optional[str], args: dict, functions: Optional[List[dict]] = None) -> str:
+    base_config = _create_base_config(require, config, args)
+    base_config['functions'] = functions if functions is not None else DBDao.get_require_functions()
     return dump_yaml(base_config)
 
 
@@ -42,26 +80,45 @@ def _clean(s: str) -> str:
 
 
 def handle_template(text: Optional[str], args: dict) -> str:
-    return Template(text).render(**generate_template_context(**args)) if text else ''
+    return render_template(text, **generate_template_context(**args)) if text else ''
+
+
+def _check_output(command: str, timeout: Optional[int] = None) -> bytes:
+    with subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          start_new_session=True) as process:
+        try:
+            out, err = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.communicate()
+            raise
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, command, output=out, stderr=err)
+        return out
 
 
-def run_transform(transform: Transform, **kwargs) -> (bool, str):
+def run_transform(transform: Transform, timeout: Optional[int] = None, shared: Optional[SharedRequire] = None,
+                  **kwargs) -> (bool, str):
     _, yaml_f = tempfile.mkstemp(suffix='.yaml')
     _, sql_f = tempfile.mkstemp(suffix='.sql')
 
-    yaml_conf = _create_config(require=transform.require, config=transform.yaml, args=kwargs)
+    with DBSession.scope():
+        shared = shared if shared is not None else SharedRequire.load()
+        base_config = _create_base_config(require=transform.require, config=transform.yaml, args=kwargs)
     sql = handle_template(transform.sql, kwargs)
+    base_config['functions'], jars = shared.select('\n'.join([sql, _get_config_text(base_config)]))
+    yaml_conf = dump_yaml(base_config)
     print(yaml_conf, file=open(yaml_f, 'w'))
     print(sql, file=open(sql_f, 'w'))
     print('q\nexit;', file=open(sql_f, 'a+'))
     run_commands = [FSQLFLY_FLINK_BIN, 'embedded',
                     '-s', get_job_header(transform, **kwargs),
                     '--environment', yaml_f,
-                    *DBDao.get_require_jar(),
+                    *jars,
                     '<', sql_f]
     print(' '.join(run_commands))
     try:
-        out = subprocess.check_output(' '.join(run_commands), shell=True, stderr=subprocess.PIPE)
+        out = _check_output(' '.join(run_commands), timeout=timeout)
     except subprocess.CalledProcessError as error:
         return False, "sql:\n {} \n\noutput: \n{} \n\n error: {}\n\nyaml: \n{}".format(transform.sql,
                                                                                        error.stdout.decode(),
@@ -81,23 +138,22 @@ def run_transform(transform: Transform, **kwargs) -> (bool, str):
     return True, out_w
 
 
+def get_debug_environment(data: dict) -> (str, List[str]):
+    with DBSession.scope():
+        return _create_config(data.get('require', ''), data.get('yaml', ''), dict()), DBDao.get_require_jar()
+
+
 def run_debug_transform(data: dict, manager: NamedTermManager) -> (str, str):
-    _, yaml_f = tempfile.mkstemp(suffix='.yaml')
-    yaml_conf = _create_config(data.get('require', ''), data.get('yaml', ''), dict())
-    print(yaml_conf, file=open(yaml_f, 'w'))
+    yaml_conf, jars = get_debug_environment(data)
+    name = TERMINAL_POOL.acquire(yaml_conf, jars) if manager is TERMINAL_POOL.manager else None
+    if name is None:
+        name = start_terminal(manager, yaml_conf, jars)
+    else:
+        logger.debug('use warm terminal {}'.format(name))
+    term = manager.terminals[name]
     real_sql = handle_template(data.get('sql', ''), dict())
-    name = manager._next_available_name()
-    run_commands = [FSQLFLY_FLINK_BIN, 'embedded',
-                    '-s', '{}{}'.format(settings.TEMP_TERMINAL_HEAD, str(name)),
-                    '--environment', yaml_f,
-                    *DBDao.get_require_jar()]
-    logger.debug('running commands is : {}'.format(' '.join(run_commands)))
-    term = manager.new_terminal(shell_command=run_commands)
 
     logger.debug('sql :{}'.format(real_sql))
     term.ptyproc.write(real_sql)
-    term.term_name = name
     setattr(term, settings.TERMINAL_OPEN_NAME, True)
-    term.run_command = ' '.join(run_commands)
-    manager.terminals[name] = term
     return name